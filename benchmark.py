@@ -0,0 +1,616 @@
+"""
+Benchmarks for the processing pipeline.
+
+    python benchmark.py readers --rows 200000 --cols 60
+    python benchmark.py clean --rows 1000000 --cols 60
+    python benchmark.py generate --rows 1000000 -o contacts.xlsx
+    python benchmark.py pipeline --rows 100000 1000000 --save bench.json
+    python benchmark.py pipeline --rows 100000 1000000 --baseline bench.json
+    python benchmark.py upload --contacts 20000 --latency 0.05 --fail-rate 0.01
+
+Each case runs in a fresh process so peak memory is measured per case;
+the readers benchmark shows calamine's memory growing with the row count,
+which is why 'auto' only uses it for small workbooks.
+The pipeline benchmark runs process_file on generated contact sheets in the
+default column layout (schema.FIELDS): skewed countries, junk and blank
+columns, and mojibake cities. Generation is seeded, so the same arguments produce the same
+workbook; generated workbooks are kept in --cache-dir between runs. Stage
+timings come from the run report each file writes (see metrics.py).
+--baseline compares against an earlier --save and exits with status 1
+when a stage got slower or used more memory than --tolerance allows.
+The upload benchmark sends a synthetic GHL output to ghl_mock.py, run in
+its own process. It then repeats the upload to check that the ledger lets
+nothing through twice. `--rate 100 --interval 10` reproduces GHL's burst limit.
+"""
+import io
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import random
+import itertools
+import argparse
+import zipfile
+import urllib.request
+import tempfile
+import multiprocessing
+from xml.sax.saxutils import escape
+from openpyxl import Workbook
+from openpyxl.utils.cell import get_column_letter
+
+import numpy as np
+import pandas as pd
+
+from readers import available_readers, open_reader
+from cleaning import DEFAULT_JUNK_TOKENS, clean_frame, junk_pattern
+from metrics import peak_rss_mb
+from job_store import JobStore
+from ghl_mock import MockGhlServer
+from ghl_upload import GhlUploader, UploadSettings, iter_archive_rows
+from schema import DEFAULT_POSITIONS, GHL_COLUMNS, RACHINBOX_COLUMNS, excel_col_to_index
+
+# Contact sheets run to column BM (Personalised_Lines); a couple of trailing
+# columns are blank or junk, like real exports.
+CONTACT_COLUMNS = excel_col_to_index('BO') + 1
+JUNK = '#!$@-'
+COUNTRIES = ["United States", "United Kingdom", "Canada", "Mexico", "Germany", "France", "Brazil", "India",
+             "Spain", "Italy", "Australia", "Netherlands", "Colombia", "Argentina", "Switzerland", "Sweden",
+             "Poland", "Japan", "Portugal", "Chile", "Belgium", "Austria", "Ireland", "Peru", "Norway",
+             "Denmark", "Finland", "Singapore", "South Africa", "New Zealand"]
+LANGUAGES = ["English", "Spanish", "French", "German", "Portuguese", "Italian", "Dutch", "Japanese"]
+OCCUPATIONS = ["Engineering", "Sales", "Marketing", "Finance", "Operations", "Human Resources", "Legal",
+               "Education", "Healthcare", "Consulting", "Design", "Support"]
+INDUSTRIES = ["Software", "Banking", "Retail", "Manufacturing", "Telecommunications", "Hospitals",
+              "Construction", "Logistics", "Insurance", "Media", "Energy", "Government"]
+CITIES = ["Ciudad de México", "São Paulo", "Montréal", "Zürich", "Bogotá", "Köln", "Düsseldorf",
+          "Québec", "Málaga", "Kraków", "Genève", "Medellín", "New York", "London", "Toronto", "Berlin",
+          "Paris", "Madrid", "Sydney", "Chicago"]
+STATES = ["CDMX", "SP", "QC", "ZH", "NRW", "Andalucía", "Île-de-France", "NY", "CA", "TX", "ON"]
+FIRST_NAMES = ["José", "María", "John", "Anna", "Łukasz", "Chloé", "Jürgen", "Wei", "Aarav", "Olivia"]
+LAST_NAMES = ["García", "Smith", "Müller", "Nowak", "Dubois", "Rossi", "Silva", "Kim", "Patel", "Jones"]
+
+def mojibake(text):
+    """UTF-8 text misread as Latin-1, e.g. "Ciudad de México" -> "Ciudad de MÃ©xico"."""
+    return text.encode('utf-8').decode('latin-1')
+
+def generate_workbook(path, rows, cols=60, seed=0):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([f"Header{i+1}" for i in range(cols)])
+    for r in range(rows):
+        ws.append([
+            rng.randint(0, 10**6) if c % 5 == 4 else f"value {rng.randint(0, 5000)}-{c}"
+            for c in range(cols)
+        ])
+    wb.save(path)
+
+def _contact_vocab(seed):
+    """Per-column value pools for the generated contact sheet."""
+    rng = random.Random(seed)
+    fields = set(DEFAULT_POSITIONS.values())
+    vocab = {}
+    for c in range(CONTACT_COLUMNS):
+        if c in fields:
+            continue
+        if c % 7 == 3:
+            vocab[c] = [None]  # always blank: dropped from the processed output
+        elif c % 7 == 5:
+            vocab[c] = [None, JUNK, ""]  # junk-only: dropped too
+        else:
+            vocab[c] = [f"note {c}-{rng.randint(0, 10**6)}" for _ in range(200)] + [None]
+    return vocab
+
+def contact_rows(rows, seed=0, skew=1.1, junk_rate=0.05, mojibake_rate=0.1, block=10000):
+    """
+    Yields `rows` rows laid out like the contact exports the pipeline expects
+    (see schema.FIELDS and the upload formats), in blocks built with numpy.
+    Countries follow a Zipf-like distribution with exponent `skew`, so a few
+    countries hold most rows; `junk_rate` of the cells in text columns carry
+    the junk token and `mojibake_rate` of the cities and states are mojibake.
+    """
+    rng = np.random.default_rng(seed)
+    col = excel_col_to_index
+    weights = 1 / np.arange(1, len(COUNTRIES) + 1) ** skew
+    country_p = weights / weights.sum()
+    cities = np.array(CITIES + [mojibake(c) for c in CITIES], dtype=object)
+    states = np.array(STATES + [mojibake(s) for s in STATES], dtype=object)
+    vocab = {c: np.array(values, dtype=object) for c, values in _contact_vocab(seed).items()}
+
+    def pick(values, n, blank=0.0, junk=0.0):
+        out = np.array(values, dtype=object)[rng.integers(0, len(values), n)]
+        roll = rng.random(n)
+        out[roll < blank] = None
+        out[(roll >= blank) & (roll < blank + junk)] = JUNK
+        return out
+
+    def with_mojibake(values, n):
+        half = len(values) // 2
+        clean = rng.integers(0, half, n)
+        return values[np.where(rng.random(n) < mojibake_rate, clean + half, clean)]
+
+    done = 0
+    while done < rows:
+        n = min(block, rows - done)
+        ids = np.arange(done, done + n)
+        first = pick(FIRST_NAMES, n)
+        last = pick(LAST_NAMES, n)
+        employer = np.array([f"Company {i}" for i in rng.integers(0, 50000, n)], dtype=object)
+        data = {c: pick(values, n, junk=junk_rate if len(values) > 3 else 0) for c, values in vocab.items()}
+        data.update({
+            col('A'): np.array([f"contact{i}@example{i % 997}.com" for i in ids], dtype=object),
+            col('E'): first,
+            col('G'): last,
+            col('K'): pick(OCCUPATIONS, n, blank=0.05, junk=junk_rate),
+            col('M'): pick(OCCUPATIONS, n, blank=0.2),
+            col('O'): pick(["Manager", "Director", "Engineer", "Analyst", "VP", "Intern"], n, junk=junk_rate),
+            col('Q'): pick(["Entry", "Senior", "Manager", "Director", "C-Level"], n, blank=0.3),
+            col('S'): with_mojibake(cities, n),
+            col('U'): with_mojibake(states, n),
+            col('W'): np.array(COUNTRIES, dtype=object)[rng.choice(len(COUNTRIES), n, p=country_p)],
+            col('AA'): np.array([f"https://linkedin.com/in/contact{i}" for i in ids], dtype=object),
+            col('AC'): employer,
+            col('AE'): np.array([f"https://{e.replace(' ', '').lower()}.com" for e in employer], dtype=object),
+            col('AG'): np.array([f"+1 555 {i % 10**7:07d}" for i in ids], dtype=object),
+            col('AI'): pick([None, "https://facebook.com/company"], n),
+            col('AK'): pick([None, "https://linkedin.com/company/x"], n),
+            col('AS'): np.array(rng.integers(1900, 2024, n).tolist(), dtype=object),
+            col('AY'): np.array([f"{z:05d}" for z in rng.integers(0, 99999, n)], dtype=object),
+            col('BE'): pick(LANGUAGES, n, blank=0.05),
+            col('BG'): pick(INDUSTRIES, n, blank=0.05, junk=junk_rate),
+            col('BI'): pick(["B2B", "B2C", "Enterprise", "SMB"], n, blank=0.4),
+            col('BK'): pick(["Python", "Excel", "Negotiation", "SEO", "Accounting"], n, blank=0.3),
+            col('BM'): pick([None, "Loved your talk on scaling teams."], n)
+        })
+        # A few rows have no country at all.
+        data[col('W')][rng.random(n) < 0.005] = None
+        yield from zip(*(data[c] for c in range(CONTACT_COLUMNS)))
+        done += n
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'styles" Target="styles.xml"/>'
+        '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'sharedStrings" Target="sharedStrings.xml"/></Relationships>'),
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>')
+}
+
+def write_xlsx(path, header, rows, row_count, max_shared=1000000):
+    """
+    Writes a single-sheet workbook by streaming the sheet XML, which is far
+    faster than openpyxl for millions of rows. Strings go into the shared
+    string table like Excel's own files; once it holds `max_shared` strings,
+    new strings are written inline so memory stays bounded.
+    """
+    width = len(header)
+    letters = [get_column_letter(c + 1) for c in range(width)]
+    shared = {}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for name, xml in XLSX_PARTS.items():
+            zf.writestr(name, xml)
+        with zf.open("xl/worksheets/sheet1.xml", 'w', force_zip64=True) as f:
+            f.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                     f'<dimension ref="A1:{letters[-1]}{row_count + 1}"/><sheetData>').encode('utf-8'))
+            for r, row in enumerate(itertools.chain([header], rows), start=1):
+                cells = []
+                for letter, value in zip(letters, row):
+                    if value is None:
+                        continue
+                    if isinstance(value, str):
+                        index = shared.get(value)
+                        if index is None and len(shared) < max_shared:
+                            index = shared[value] = len(shared)
+                        if index is None:
+                            cells.append(f'<c r="{letter}{r}" t="inlineStr"><is><t>{escape(value)}</t></is></c>')
+                        else:
+                            cells.append(f'<c r="{letter}{r}" t="s"><v>{index}</v></c>')
+                    else:
+                        cells.append(f'<c r="{letter}{r}"><v>{value}</v></c>')
+                f.write(f'<row r="{r}">{"".join(cells)}</row>'.encode('utf-8'))
+            f.write(b'</sheetData></worksheet>')
+        with zf.open("xl/sharedStrings.xml", 'w', force_zip64=True) as f:
+            f.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                     f'uniqueCount="{len(shared)}">').encode('utf-8'))
+            for value in shared:
+                f.write(f'<si><t xml:space="preserve">{escape(value)}</t></si>'.encode('utf-8'))
+            f.write(b'</sst>')
+
+def generate_contacts(path, rows, seed=0, **options):
+    """Writes a generated contact sheet (with a header row) to an .xlsx or .csv file."""
+    header = [f"Column{c + 1}" for c in range(CONTACT_COLUMNS)]
+    for field, position in DEFAULT_POSITIONS.items():
+        header[position] = field.replace('_', ' ').title()
+    for name, field in GHL_COLUMNS + RACHINBOX_COLUMNS:
+        header[DEFAULT_POSITIONS[field]] = name
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(contact_rows(rows, seed, **options))
+    else:
+        write_xlsx(path, header, contact_rows(rows, seed, **options), rows)
+
+def cached_contacts(cache_dir, rows, seed, fmt, **options):
+    """Generates a contact sheet once per set of parameters and reuses it afterwards."""
+    os.makedirs(cache_dir, exist_ok=True)
+    tag = "_".join(f"{key}{value}" for key, value in sorted(options.items()))
+    path = os.path.join(cache_dir, f"contacts_{rows}_s{seed}_{tag}.{fmt}")
+    if not os.path.exists(path):
+        print(f"Generating {rows} contact rows into {path}...")
+        # Written under another name first so an interrupted run never leaves a truncated cache entry.
+        partial = os.path.join(cache_dir, "partial_" + os.path.basename(path))
+        generate_contacts(partial, rows, seed, **options)
+        os.replace(partial, path)
+    return path
+
+def _run_case(target, args, results):
+    start_rss = peak_rss_mb()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    outcome = target(*args)
+    # Targets return a count, or a dict with a "count" and extra details.
+    result = dict(outcome) if isinstance(outcome, dict) else {"count": outcome}
+    result.update({
+        "wall": time.perf_counter() - wall,
+        "cpu": time.process_time() - cpu,
+        "peak_mb": None if start_rss is None else peak_rss_mb() - start_rss
+    })
+    results.put(result)
+
+def run_isolated(target, *args):
+    """Runs target(*args) in a fresh process and returns its timings."""
+    results = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_case, args=(target, args, results))
+    proc.start()
+    result = results.get()
+    proc.join()
+    return result
+
+def read_all(path, backend):
+    count = 0
+    with open_reader(path, backend) as reader:
+        for _ in reader.iter_rows():
+            count += 1
+    return count
+
+def generate_frame(rows, cols=60, seed=0):
+    """An object-dtype sheet like the reader produces, with junk and blank columns."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"value {i}" for i in range(5000)] + ["#!$@-", "x #!$@- y", None], dtype=object)
+    data = {}
+    for c in range(cols):
+        if c % 2:
+            data[f"Column{c+1}"] = rng.choice(np.array([None, "#!$@-", ""], dtype=object), rows)
+        else:
+            data[f"Column{c+1}"] = vocab[rng.integers(0, len(vocab), rows)]
+    return pd.DataFrame(data, dtype=object)
+
+def generate_only(rows, cols):
+    generate_frame(rows, cols)
+    return rows * cols
+
+def clean_applymap(rows, cols):
+    """The previous clean_data: a Python call per cell."""
+    df = generate_frame(rows, cols)
+    df.mask(df.applymap(lambda x: isinstance(x, str) and '#!$@-' in x), '')
+    return rows * cols
+
+def clean_vectorized(rows, cols):
+    df = generate_frame(rows, cols)
+    clean_frame(df, junk_pattern(DEFAULT_JUNK_TOKENS))
+    return rows * cols
+
+class _NullReporter:
+    def set_status(self, text):
+        pass
+
+    def set_progress(self, value):
+        pass
+
+def run_pipeline(path, options):
+    """Runs process_file on `path` with a warm pool and returns its run report."""
+    from pipeline import Processor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, "state"))
+        processor = Processor(_NullReporter(), store)
+        processor.save_dir = os.path.join(tmp, "out")
+        for name, value in options.items():
+            if name == "cpu_percent":
+                processor.pool.set_cpu_percent(value)
+            else:
+                setattr(processor, name, value)
+        try:
+            # The app warms the pool at startup; keep process spawning out of the timings.
+            for future in [processor.pool.submit(int) for _ in range(processor.pool.max_workers)]:
+                future.result()
+            processor.process_file(path)
+        finally:
+            processor.pool.shutdown()
+            store.close()
+        reports = glob.glob(os.path.join(processor.save_dir, "report_*.json"))
+        with open(reports[0], encoding='utf-8') as f:
+            report = json.load(f)
+    stages = {stage["name"]: stage for stage in report["stages"]}
+    return {"count": stages["read"]["rows"], "stages": stages, "tasks": report["tasks"]}
+
+def pipeline_summary(result):
+    """Flattens one pipeline run into {case: metrics} for printing and baselines."""
+    # Stage peaks are the absolute RSS of the benchmark process, so the total is their max.
+    peaks = [stage["peak_rss_mb"] for stage in result["stages"].values() if stage["peak_rss_mb"] is not None]
+    summary = {"total": {"wall_s": result["wall"], "cpu_s": result["cpu"],
+                         "rows_per_s": result["count"] / result["wall"] if result["wall"] else 0,
+                         "peak_rss_mb": max(peaks) if peaks else None}}
+    for name, stage in result["stages"].items():
+        summary[name] = {key: stage[key] for key in ("wall_s", "cpu_s", "rows_per_s", "peak_rss_mb")}
+    tasks = result["tasks"]
+    if tasks:
+        summary["workers"] = {
+            "wall_s": sum(task["wall_s"] for task in tasks),
+            "cpu_s": sum(task["cpu_s"] for task in tasks),
+            "rows_per_s": None,
+            "peak_rss_mb": max((task["peak_rss_mb"] or 0) for task in tasks)
+        }
+    return summary
+
+def print_pipeline(rows, summary, sections):
+    print(f"\nprocess_file on {rows:,} rows")
+    print(f"{'stage':<10}{'wall s':>10}{'cpu s':>10}{'rows/sec':>14}{'peak MB':>10}")
+    for name, m in summary.items():
+        rate = "" if not m["rows_per_s"] else f"{m['rows_per_s']:,.0f}"
+        peak = "n/a" if m["peak_rss_mb"] is None else f"{m['peak_rss_mb']:.1f}"
+        print(f"{name:<10}{m['wall_s']:>10.2f}{m['cpu_s']:>10.2f}{rate:>14}{peak:>10}")
+    for name, stage_sections in sections.items():
+        if stage_sections:
+            parts = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in stage_sections.items())
+            print(f"  {name}: {parts}")
+
+def compare_baseline(results, baseline, tolerance):
+    """Returns a line per case that is slower or larger than baseline * (1 + tolerance)."""
+    regressions = []
+    for rows, summary in results.items():
+        for case, metrics in summary.items():
+            before = baseline.get(rows, {}).get(case)
+            if before is None:
+                continue
+            for key in ("wall_s", "peak_rss_mb"):
+                old, new = before.get(key), metrics.get(key)
+                if old and new is not None and new > old * (1 + tolerance):
+                    regressions.append(f"{rows} rows, {case}: {key} {old:.2f} -> {new:.2f}")
+    return regressions
+
+def bench_generate(args):
+    generate_contacts(args.output, args.rows, args.seed, skew=args.skew, junk_rate=args.junk_rate,
+                      mojibake_rate=args.mojibake_rate)
+    print(f"Wrote {args.rows} rows to {args.output} ({os.path.getsize(args.output) / (1024 * 1024):.1f} MB)")
+
+def bench_pipeline(args):
+    options = {"read_backend": args.backend, "sort_mode": args.sort_mode, "zip_method": args.zip_method}
+    if args.cpu:
+        options["cpu_percent"] = args.cpu
+    setup = {"options": options, "format": args.format, "seed": args.seed, "skew": args.skew,
+             "junk_rate": args.junk_rate, "mojibake_rate": args.mojibake_rate}
+    results = {}
+    for rows in args.rows:
+        path = cached_contacts(args.cache_dir, rows, args.seed, args.format, skew=args.skew,
+                               junk_rate=args.junk_rate, mojibake_rate=args.mojibake_rate)
+        # Best of --repeat runs, by total wall time.
+        best = min((run_isolated(run_pipeline, path, options) for _ in range(args.repeat)),
+                   key=lambda result: result["wall"])
+        results[str(rows)] = pipeline_summary(best)
+        print_pipeline(rows, results[str(rows)],
+                       {name: stage["sections"] for name, stage in best["stages"].items()})
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(dict(setup, results=results), f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        changed = [key for key in setup if baseline.get(key) != setup[key]]
+        if changed:
+            print(f"\nWarning: {args.baseline} was run with different {', '.join(changed)}")
+        regressions = compare_baseline(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+def write_ghl_archive(path, contacts, seed=0, countries=5, repeat_rate=0.02, missing_rate=0.01):
+    """
+    Writes a zip shaped like a ghl_<timestamp>.zip: one CSV per country.
+    `repeat_rate` of the rows repeat an earlier contact (with another country,
+    so they are upserted again), and `missing_rate` have no email or phone.
+    """
+    rng = random.Random(seed)
+    headers = [header for header, _ in GHL_COLUMNS]
+    titles = ["Engineer", "Manager", "Director", "Analyst", "Consultant"]
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for country in range(countries):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(headers)
+            for i in range(country, contacts, countries):
+                n = rng.randrange(i) if i and rng.random() < repeat_rate else i
+                values = {
+                    "Email": "" if rng.random() < missing_rate else f"contact{n}@example{n % 97}.com",
+                    "First_Name": f"First{n}",
+                    "Last_Name": f"Last{n}",
+                    "Job_Title": rng.choice(titles),
+                    "Country": f"Country{country}",
+                    "Employer": f"Employer {n % 1000}"
+                }
+                writer.writerow([values.get(header, "") for header in headers])
+            archive.writestr(f"Country{country}_ghl.csv", buffer.getvalue())
+
+def _serve_mock(options, urls):
+    server = MockGhlServer(**options)
+    urls.put(server.start())
+    server.thread.join()
+
+def bench_upload(args):
+    options = {"token": "bench", "rate": args.rate, "interval": args.interval, "fail_rate": args.fail_rate,
+               "latency": args.latency, "seed": args.seed}
+    urls = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve_mock, args=(options, urls), daemon=True)
+    server.start()
+    try:
+        url = urls.get(timeout=30)
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, "ghl_bench.zip")
+            write_ghl_archive(archive, args.contacts, args.seed)
+            store = JobStore(os.path.join(tmp, "state"))
+            settings = UploadSettings("bench", "bench-location", url, concurrency=args.concurrency,
+                                      batch_size=args.batch_size, rate=args.rate, interval=args.interval)
+            print(f"{'run':<10}{'contacts/sec':>14}{'wall s':>10}{'sent':>8}{'skipped':>9}{'rejected':>10}"
+                  f"{'failed':>8}{'retries':>9}{'conns':>7}")
+            for run in ("upload", "re-run"):
+                started = time.perf_counter()
+                result = GhlUploader(settings, store).upload(iter_archive_rows(archive))
+                wall = time.perf_counter() - started
+                print(f"{run:<10}{result.rows / wall:>14,.0f}{wall:>10.2f}{result.sent:>8}{result.skipped:>9}"
+                      f"{result.rejected:>10}{result.failed:>8}{result.retries:>9}{result.connections:>7}")
+            store.close()
+        with urllib.request.urlopen(url + "/stats") as response:
+            stats = json.load(response)
+    finally:
+        server.terminate()
+    print(f"\nServer: {stats.get('requests', 0)} requests, {stats.get('created', 0)} created, "
+          f"{stats.get('updated', 0)} updated, {stats.get('rate_limited', 0)} rate-limited, "
+          f"{stats.get('failed', 0)} failed on purpose, {stats.get('duplicates', 0)} sent twice")
+
+def print_table(title, unit, rows):
+    print(f"\n{title}")
+    print(f"{'case':<16}{unit + '/sec':>14}{'wall s':>10}{'cpu s':>10}{'peak MB':>10}")
+    for name, result in rows:
+        peak = "n/a" if result["peak_mb"] is None else f"{result['peak_mb']:.1f}"
+        rate = result["count"] / result["wall"] if result["wall"] else 0
+        print(f"{name:<16}{rate:>14,.0f}{result['wall']:>10.2f}{result['cpu']:>10.2f}{peak:>10}")
+
+def bench_readers(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.xlsx")
+        print(f"Generating {args.rows} x {args.cols} workbook...")
+        generate_workbook(path, args.rows, args.cols)
+        print(f"Workbook size: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+
+        backends = args.backends or available_readers()
+        results = [(backend, run_isolated(read_all, path, backend)) for backend in backends]
+        print_table("xlsx reader backends", "rows", results)
+
+def bench_clean(args):
+    cases = [("applymap", clean_applymap), ("vectorized", clean_vectorized)]
+    results = []
+    # Frame generation is timed on its own and subtracted from every case.
+    setup = run_isolated(generate_only, args.rows, args.cols)
+    for name, fn in cases:
+        result = run_isolated(fn, args.rows, args.cols)
+        result["wall"] = max(result["wall"] - setup["wall"], 1e-9)
+        result["cpu"] = max(result["cpu"] - setup["cpu"], 0)
+        results.append((name, result))
+    print_table(f"clean_data on {args.rows} x {args.cols} (frame generation excluded)", "cells", results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    readers = sub.add_parser("readers", help="Compare xlsx reader backends")
+    readers.add_argument("--rows", type=int, default=100000)
+    readers.add_argument("--cols", type=int, default=60)
+    readers.add_argument("--backends", nargs="*", choices=available_readers())
+    readers.set_defaults(func=bench_readers)
+
+    clean = sub.add_parser("clean", help="Compare per-cell and vectorized junk cleaning")
+    clean.add_argument("--rows", type=int, default=1000000)
+    clean.add_argument("--cols", type=int, default=60)
+    clean.set_defaults(func=bench_clean)
+
+    def add_contact_options(sub_parser):
+        sub_parser.add_argument("--seed", type=int, default=0)
+        sub_parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the country mix")
+        sub_parser.add_argument("--junk-rate", type=float, default=0.05, help="Share of text cells holding junk")
+        sub_parser.add_argument("--mojibake-rate", type=float, default=0.1, help="Share of mojibake cities/states")
+
+    generate = sub.add_parser("generate", help="Write a synthetic contact sheet in the default column layout")
+    generate.add_argument("--rows", type=int, default=100000)
+    generate.add_argument("-o", "--output", required=True, help=".xlsx or .csv file to write")
+    add_contact_options(generate)
+    generate.set_defaults(func=bench_generate)
+
+    pipeline = sub.add_parser("pipeline", help="Time process_file and each of its stages")
+    pipeline.add_argument("--rows", type=int, nargs="+", default=[100000])
+    pipeline.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    pipeline.add_argument("--repeat", type=int, default=1, help="Keep the fastest of this many runs")
+    pipeline.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "bulk_data_cleaner_bench"))
+    pipeline.add_argument("--backend", default="auto")
+    pipeline.add_argument("--sort-mode", choices=["auto", "memory", "external"], default="auto")
+    pipeline.add_argument("--zip-method", default="deflate")
+    pipeline.add_argument("--cpu", type=int, help="Max CPU %% for the worker pool")
+    pipeline.add_argument("--save", metavar="FILE", help="Write the results as JSON")
+    pipeline.add_argument("--baseline", metavar="FILE", help="Compare against results saved with --save")
+    pipeline.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown/growth, e.g. 0.2 = 20%%")
+    add_contact_options(pipeline)
+    pipeline.set_defaults(func=bench_pipeline)
+
+    upload = sub.add_parser("upload", help="Upload synthetic GHL contacts to the local mock server")
+    upload.add_argument("--contacts", type=int, default=20000)
+    upload.add_argument("--concurrency", type=int, default=16)
+    upload.add_argument("--batch-size", type=int, default=200)
+    upload.add_argument("--rate", type=int, default=5000, help="Requests allowed per interval (mock and client)")
+    upload.add_argument("--interval", type=float, default=1.0, help="Rate-limit window, in seconds")
+    upload.add_argument("--latency", type=float, default=0.05, help="Seconds the mock takes per upsert")
+    upload.add_argument("--fail-rate", type=float, default=0.0, help="Share of upserts the mock fails with a 503")
+    upload.add_argument("--seed", type=int, default=0)
+    upload.set_defaults(func=bench_upload)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,283 @@
+"""
+Headless batch mode: runs the same pipeline as the GUI without importing tkinter.
+
+    python -m cli INPUT... -o OUTPUT_DIR [options]
+    python -m cli --watch DROP_DIR -o OUTPUT_DIR [options]
+    python -m cli -o OUTPUT_DIR [options]
+
+INPUT may be .xlsx or .csv files, .zip files of them (nested zips included;
+members are streamed, not extracted), or directories to scan.
+Unfinished files left in the job store by an earlier run are resumed first
+(with no INPUT, only those are run); an input that is still queued is not
+queued a second time.
+In watch mode a new drop is queued once its size and mtime have stopped
+changing between two scans, and the queue is processed as drops arrive.
+Ctrl+C stops at the next checkpoint; the next run picks up from there.
+City/State/Country values are repaired (mojibake, accents) and the changes
+are listed in locations_<timestamp>.csv. Each finished file also gets a
+per-stage run report (report_<timestamp>.json/.csv) next to its zips;
+--profile DIR adds cProfile dumps of every stage and task. --parquet also
+writes every output as <output>_<timestamp>.parquet/<country>.parquet (needs pyarrow).
+With --ghl-location the GHL output is also upserted into that GoHighLevel
+location (token from --ghl-token or $GHL_TOKEN); a stopped upload resumes
+without re-sending contacts, and rejected ones go to upload_errors_<timestamp>.csv.
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import multiprocessing
+
+INPUT_EXTENSIONS = ('.xlsx', '.csv', '.zip')
+
+class ConsoleReporter:
+    """Prints the status line at most once every `interval` seconds."""
+
+    def __init__(self, interval=1.0, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.last_text = None
+        self.last_time = 0
+
+    def set_status(self, text):
+        now = time.monotonic()
+        if text != self.last_text and now - self.last_time >= self.interval:
+            print(text, file=self.stream, flush=True)
+            self.last_text = text
+            self.last_time = now
+
+    def set_progress(self, value):
+        pass
+
+def collect_inputs(paths):
+    """Expands directories into the input files under them, in a stable order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(INPUT_EXTENSIONS) and not name.startswith('~$'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def queue_input(processor, path):
+    path = os.path.abspath(path)
+    if path.lower().endswith('.zip'):
+        count = processor.enqueue_zip(path)
+        print(f"Queued {count} files from {path}", file=sys.stderr)
+    elif path.lower().endswith(('.xlsx', '.csv')):
+        if processor.enqueue(path):
+            print(f"Queued {path}", file=sys.stderr)
+        else:
+            print(f"Already queued: {path}", file=sys.stderr)
+    else:
+        print(f"Ignoring {path}: not an .xlsx, .csv or .zip file", file=sys.stderr)
+
+class DropWatcher:
+    """
+    Reports files dropped into `folder`. A file is only reported once its size
+    and mtime are unchanged between two scans, so half-copied drops are left
+    alone; drops already queued (recorded in the job store) are skipped.
+    """
+
+    def __init__(self, folder, store):
+        self.folder = folder
+        self.store = store
+        self.pending = {}
+
+    def scan(self):
+        ready = []
+        for path in collect_inputs([self.folder]):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = (st.st_size, st.st_mtime)
+            if self.store.is_ingested(path, *signature):
+                continue
+            if self.pending.get(path) == signature:
+                del self.pending[path]
+                ready.append((path, signature))
+            else:
+                self.pending[path] = signature
+        return ready
+
+def run_queue(processor):
+    """Runs the queue on a worker thread so Ctrl+C can stop it at a checkpoint."""
+    # Waits on an event rather than join(): before Python 3.13, a join
+    # interrupted by Ctrl+C marks the thread stopped while it is still running,
+    # so the second wait would return before the stages reached a checkpoint.
+    finished = threading.Event()
+
+    def run():
+        try:
+            processor.process_queue()
+        finally:
+            finished.set()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    try:
+        while not finished.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        print("Stopping; unfinished files resume on the next run", file=sys.stderr)
+        processor.control.stop()
+        finished.wait()
+        raise
+
+def print_summary(processor):
+    failed = 0
+    for job in processor.started_jobs:
+        record = processor.store.get(job.id)
+        if record is None:
+            continue
+        line = f"{record.name}: {record.status}"
+        if record.error:
+            line += f" ({record.error})"
+        failed += record.status == "failed"
+        print(line)
+    return failed
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help=".xlsx, .csv or .zip files, or directories")
+    parser.add_argument("-o", "--output", required=True, help="Folder the zipped outputs are written to")
+    parser.add_argument("--watch", metavar="DIR", help="Keep running and queue files dropped into DIR")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between watch-folder scans")
+    parser.add_argument("--cpu", type=int, help="Max CPU %% for the worker pool")
+    parser.add_argument("--chunk-rows", type=int, help="Rows read per chunk")
+    parser.add_argument("--chunk-mb", type=int, help="Target in-memory size of a chunk, in MB")
+    parser.add_argument("--outputs", nargs="+", help="Outputs to produce (default: all)")
+    parser.add_argument("--backend", default="auto",
+                        help="xlsx reader backend (auto streams with xml; calamine is faster but loads the whole sheet into memory)")
+    parser.add_argument("--sort-mode", choices=["auto", "memory", "external"], default="auto")
+    parser.add_argument("--sort-memory-mb", type=int, help="Largest country sorted in memory in auto mode")
+    parser.add_argument("--zip-method", default=None, help="stored, deflate or zstd")
+    parser.add_argument("--zip-level", type=int, help="Compression level")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also write each output as a folder of Parquet files next to its zip (needs pyarrow)")
+    parser.add_argument("--ghl-location", metavar="ID", help="Upload the GHL output to this GoHighLevel location")
+    parser.add_argument("--ghl-token", default=os.environ.get("GHL_TOKEN"),
+                        help="GHL API token (default: $GHL_TOKEN)")
+    parser.add_argument("--ghl-url", help="API base URL, e.g. a local python -m ghl_mock")
+    parser.add_argument("--ghl-concurrency", type=int, help="Connections used for the upload")
+    parser.add_argument("--ghl-rate", type=int, help="Requests allowed per 10 seconds")
+    parser.add_argument("--junk-token", action="append", metavar="TOKEN",
+                        help="Blank cells containing TOKEN; repeat for several (default: '#!$@-')")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Leave City/State/Country as they are (no mojibake repair or accent folding)")
+    parser.add_argument("--no-report", action="store_true", help="Don't write report_<timestamp>.json/.csv run reports")
+    parser.add_argument("--profile", metavar="DIR", help="Run every stage and pool task under cProfile, dumping .prof files into DIR")
+    parser.add_argument("--state-dir", help="Job store directory (default: ~/.bulk_data_cleaner)")
+    return parser
+
+def configure(processor, args, parser):
+    # Imported here so --help and argument errors don't pay for pandas.
+    from pipeline import OUTPUTS
+    from readers import READERS
+    from zip_stream import COMPRESSION_METHODS
+    from parquet_sink import parquet_available
+
+    if args.backend != 'auto' and args.backend not in READERS:
+        parser.error(f"--backend must be auto or one of {', '.join(READERS)}")
+    if args.outputs and set(args.outputs) - set(OUTPUTS):
+        parser.error(f"--outputs must be among {', '.join(OUTPUTS)}")
+    if args.zip_method and args.zip_method not in COMPRESSION_METHODS:
+        parser.error(f"--zip-method must be one of {', '.join(COMPRESSION_METHODS)}")
+    if args.parquet and not parquet_available():
+        parser.error("--parquet needs the 'pyarrow' package (pip install pyarrow)")
+    if args.ghl_location and not args.ghl_token:
+        parser.error("--ghl-location needs --ghl-token or $GHL_TOKEN")
+    if args.ghl_location and args.outputs and 'ghl' not in args.outputs:
+        parser.error("--ghl-location uploads the ghl output; add it to --outputs")
+
+    processor.save_dir = os.path.abspath(args.output)
+    processor.read_backend = args.backend
+    processor.sort_mode = args.sort_mode
+    if args.chunk_rows:
+        processor.chunk_rows = args.chunk_rows
+    if args.chunk_mb:
+        processor.chunk_bytes = args.chunk_mb * 1024 * 1024
+    if args.outputs:
+        processor.outputs = [output for output in OUTPUTS if output in args.outputs]
+    if args.sort_memory_mb:
+        processor.sort_memory_mb = args.sort_memory_mb
+    if args.zip_method:
+        processor.zip_method = args.zip_method
+    if args.zip_level is not None:
+        processor.zip_level = args.zip_level
+    if args.parquet:
+        processor.parquet_outputs = True
+    if args.ghl_location:
+        from ghl_upload import DEFAULT_BASE_URL, UploadSettings
+        settings = UploadSettings(args.ghl_token, args.ghl_location, args.ghl_url or DEFAULT_BASE_URL)
+        if args.ghl_concurrency:
+            settings.concurrency = args.ghl_concurrency
+        if args.ghl_rate:
+            settings.rate = args.ghl_rate
+        processor.ghl_upload = settings
+    if args.junk_token:
+        processor.junk_tokens = args.junk_token
+    if args.no_normalize:
+        processor.normalize_locations = False
+    if args.no_report:
+        processor.write_reports = False
+    if args.profile:
+        processor.profile_dir = os.path.abspath(args.profile)
+    if args.cpu:
+        processor.pool.set_cpu_percent(args.cpu)
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    from job_store import JobStore
+
+    store = JobStore(args.state_dir) if args.state_dir else JobStore()
+    if not args.inputs and not args.watch and not store.unfinished():
+        parser.error("give at least one input or --watch DIR (no unfinished files to resume)")
+
+    from pipeline import Processor
+    processor = Processor(ConsoleReporter(), store)
+    configure(processor, args, parser)
+    # A daemon is usually stopped with SIGTERM; treat it (and SIGINT, even if
+    # the parent shell ignored it) like Ctrl+C.
+    signal.signal(signal.SIGINT, _interrupt)
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        for path in collect_inputs(args.inputs):
+            queue_input(processor, path)
+            if os.path.exists(path):
+                st = os.stat(path)
+                store.mark_ingested(os.path.abspath(path), st.st_size, st.st_mtime)
+        if processor.queue:
+            run_queue(processor)
+        if args.watch:
+            watcher = DropWatcher(os.path.abspath(args.watch), store)
+            print(f"Watching {watcher.folder}", file=sys.stderr)
+            while True:
+                for path, signature in watcher.scan():
+                    queue_input(processor, path)
+                    store.mark_ingested(path, *signature)
+                if processor.queue:
+                    run_queue(processor)
+                    print_summary(processor)
+                else:
+                    time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        processor.pool.shutdown()
+    return 1 if print_summary(processor) else 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
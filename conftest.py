@@ -0,0 +1 @@
+# The modules live at the top of the repo; pytest puts this directory on sys.path for tests/.
@@ -0,0 +1,103 @@
+"""
+Size-bounded CSV output.
+
+RollingCsvWriter counts the exact encoded bytes it writes and starts a new
+`<name>_part_N.csv` (with the header repeated) before a part would pass the
+size limit, so output files never have to be re-read and split afterwards.
+"""
+import io
+import os
+import csv
+
+DEFAULT_SIZE_LIMIT = 48 * 1024 * 1024
+
+class RollingCsvWriter:
+    """
+    Writes CSV records to `filename` in `directory`, rolling over to
+    `filename_part_N.csv` files once the size limit would be exceeded.
+
+    With single_name=True the first part keeps `filename` and is only renamed
+    to `_part_1.csv` when a second part is needed, so small outputs keep their
+    plain name. A single record larger than the limit still gets a part of its own.
+    """
+
+    def __init__(self, directory, filename, header, size_limit=DEFAULT_SIZE_LIMIT,
+                 encoding='utf-8', lineterminator=os.linesep, single_name=True):
+        self.directory = directory
+        self.filename = filename
+        self.size_limit = size_limit
+        self.encoding = encoding
+        self.lineterminator = lineterminator
+        self.single_name = single_name
+        self.header = self._render([header])
+        self.files = []
+        self.f = None
+        self.size = 0
+        self._open_part()
+
+    def _render(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator=self.lineterminator).writerows(rows)
+        return buffer.getvalue().encode(self.encoding)
+
+    def _part_name(self, number):
+        return f"{self.filename}_part_{number}.csv"
+
+    def _open_part(self):
+        if self.f is not None:
+            self.f.close()
+        if len(self.files) == 1 and self.single_name:
+            # The output is about to get a second part; give the first one its part name.
+            first = self._part_name(1)
+            os.replace(os.path.join(self.directory, self.files[0]), os.path.join(self.directory, first))
+            self.files[0] = first
+        if self.files or not self.single_name:
+            name = self._part_name(len(self.files) + 1)
+        else:
+            name = self.filename
+        self.files.append(name)
+        self.f = open(os.path.join(self.directory, name), 'wb')
+        self.f.write(self.header)
+        self.size = len(self.header)
+
+    def _fits(self, data):
+        return self.size + len(data) <= self.size_limit or self.size == len(self.header)
+
+    def _write(self, data):
+        if not self._fits(data):
+            self._open_part()
+        self.f.write(data)
+        self.size += len(data)
+
+    def write_row(self, row):
+        self._write(self._render([row]))
+
+    def write_frame(self, df):
+        """
+        Writes a DataFrame's rows formatted by pandas' to_csv. A block that does
+        not fit in the current part is halved until the pieces do, so records
+        are never cut and the formatting matches a plain to_csv call.
+        """
+        data = df.to_csv(header=False, index=False, lineterminator=self.lineterminator).encode(self.encoding)
+        if self.size + len(data) <= self.size_limit or len(df) == 1:
+            self._write(data)
+            return
+        middle = len(df) // 2
+        self.write_frame(df.iloc[:middle])
+        self.write_frame(df.iloc[middle:])
+
+    def close(self):
+        """Closes the current part and returns the names of every file written."""
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        return list(self.files)
+
+    def abort(self):
+        """Closes and deletes everything written so far."""
+        self.close()
+        for name in self.files:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        self.files = []
@@ -0,0 +1,242 @@
+"""
+External merge sort for country groups that do not fit in memory.
+
+Rows are spilled as sorted runs into an append-only file of column blocks.
+String columns are dictionary-encoded (codes + uniques), and the codes arrays
+are stored as raw out-of-band pickle buffers. Workers memory-map the file and
+decode a block straight from the mapping, so a worker only needs the file
+path and run offsets. A run is read back one block at a time, so merging k
+runs holds about k blocks regardless of how large the group is. Blocks are
+sized when a spill is created (spill_block_rows) and the fan-in when it is
+merged (merge_fan_in), so a merge stays within the sort memory cap.
+"""
+import os
+import mmap
+import heapq
+import pickle
+import struct
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+
+BLOCK_ROWS = 10000
+MIN_BLOCK_ROWS = 100
+MAX_FAN_IN = 64
+# Rough ratio of a group's in-memory DataFrame size to its encoded spill size.
+SPILL_EXPANSION = 8
+
+BLOCK_HEADER = struct.Struct("<QI")  # pickle length, buffer count
+BUFFER_HEADER = struct.Struct("<Q")  # buffer length
+
+def sort_key(value):
+    """
+    Orders values the way pandas sorts an object column: missing values last,
+    numbers (and other non-strings) before strings when a column is mixed.
+    """
+    if value is None or value != value:
+        return (1,)
+    if isinstance(value, str):
+        return (0, 1, value)
+    return (0, 0, value)
+
+def row_key(positions):
+    def key(row):
+        return tuple(sort_key(row[i]) for i in positions)
+    return key
+
+def spill_block_rows(memory, row_bytes):
+    """
+    Rows per spilled block such that merging MAX_FAN_IN runs (one decoded
+    block each, plus the output block) fits in `memory` bytes, for rows
+    taking `row_bytes` in memory. BLOCK_ROWS when there is no cap.
+    """
+    if not memory:
+        return BLOCK_ROWS
+    rows = memory // ((MAX_FAN_IN + 2) * max(1, row_bytes))
+    return int(min(BLOCK_ROWS, max(MIN_BLOCK_ROWS, rows)))
+
+def merge_fan_in(spill, memory):
+    """How many runs of `spill` one merge reads at once to stay within `memory` bytes."""
+    if not memory or not spill.rows:
+        return MAX_FAN_IN
+    block_bytes = spill.size() * SPILL_EXPANSION / spill.rows * spill.block_rows
+    # One decoded block per run, plus the output block and the frame built from it.
+    return int(min(MAX_FAN_IN, max(2, memory // block_bytes - 2)))
+
+def iter_blocks(rows, size=BLOCK_ROWS):
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def encode_column(values):
+    """
+    Dictionary-encodes an all-string column. Columns holding anything else are
+    kept as-is: factorize would merge values that hash equal (1, 1.0, True).
+    """
+    if infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        return values
+    codes, uniques = pd.factorize(values)
+    # Missing values get code -1, which take() maps onto the trailing None.
+    return codes.astype(np.int32), np.append(uniques.astype(object), None)
+
+def decode_column(encoded):
+    if isinstance(encoded, tuple):
+        codes, uniques = encoded
+        return uniques.take(codes)
+    return encoded
+
+def object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def write_block(f, columns):
+    buffers = []
+    data = pickle.dumps([encode_column(c) for c in columns], protocol=5, buffer_callback=buffers.append)
+    f.write(BLOCK_HEADER.pack(len(data), len(buffers)))
+    f.write(data)
+    for buf in buffers:
+        raw = buf.raw()
+        f.write(BUFFER_HEADER.pack(raw.nbytes))
+        f.write(raw)
+
+def read_block(view, pos, width=None):
+    """
+    Decodes the block at `pos` of a memory-mapped spill. Returns (columns, next pos).
+    A block spilled before the sheet grew wider is padded with empty columns up to `width`.
+    """
+    length, count = BLOCK_HEADER.unpack_from(view, pos)
+    pos += BLOCK_HEADER.size
+    data = view[pos:pos + length]
+    pos += length
+    buffers = []
+    for _ in range(count):
+        (size,) = BUFFER_HEADER.unpack_from(view, pos)
+        pos += BUFFER_HEADER.size
+        buffers.append(view[pos:pos + size])
+        pos += size
+    # The codes arrays alias the mapping; decoding copies them out before it is closed.
+    columns = [decode_column(c) for c in pickle.loads(data, buffers=buffers)]
+    data.release()
+    for buf in buffers:
+        buf.release()
+    if width is not None and len(columns) < width:
+        rows = len(columns[0]) if columns else 0
+        columns += [np.full(rows, None, dtype=object) for _ in range(width - len(columns))]
+    return columns, pos
+
+def release_pages(mm, start, end):
+    """
+    Drops the pages of an already decoded block from the mapping. They are
+    clean file pages, but they would otherwise stay in the process's RSS
+    until the whole run has been read.
+    """
+    if hasattr(mmap, "MADV_DONTNEED"):
+        start -= start % mmap.PAGESIZE
+        end -= end % mmap.PAGESIZE
+        if end > start:
+            mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+class SpillFile:
+    """
+    An append-only file of sorted runs. Picklable, so it can be handed to a worker.
+    Runs spilled before a ragged sheet grew wider have fewer columns; the
+    readers take the current `width` and pad them. `block_rows` is the most
+    rows written per block and `rows` the number spilled so far.
+    """
+    # Defaults for spills pickled into checkpoints before these were tracked.
+    block_rows = BLOCK_ROWS
+    rows = 0
+
+    def __init__(self, path, block_rows=BLOCK_ROWS):
+        self.path = path
+        self.block_rows = block_rows
+        self.rows = 0
+        self.runs = []  # (byte offset, block count) per run
+
+    def _append(self, blocks):
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            count = 0
+            for columns in blocks:
+                write_block(f, columns)
+                count += 1
+                self.rows += len(columns[0]) if columns else 0
+        if count:
+            self.runs.append((offset, count))
+
+    def append_frame(self, df):
+        """Appends a sorted DataFrame as one run."""
+        size = self.block_rows
+        self._append(
+            [df[col].to_numpy(dtype=object)[start:start + size] for col in df.columns]
+            for start in range(0, len(df), size)
+        )
+
+    def append_run(self, rows):
+        """Appends already-sorted row tuples as one run."""
+        self._append([object_array(col) for col in zip(*block)] for block in iter_blocks(rows, self.block_rows))
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def iter_run_columns(self, run, width=None):
+        """Yields each block of a run as a list of object column arrays."""
+        offset, blocks = run
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                pos = offset
+                for _ in range(blocks):
+                    start = pos
+                    columns, pos = read_block(view, pos, width)
+                    release_pages(mm, start, pos)
+                    yield columns
+            finally:
+                view.release()
+
+    def iter_run(self, run, width=None):
+        for columns in self.iter_run_columns(run, width):
+            yield from zip(*columns)
+
+    def read_columns(self, width=None):
+        """Every run, in spill order, as one object array per column."""
+        blocks = [columns for run in self.runs for columns in self.iter_run_columns(run, width)]
+        if not blocks:
+            return None
+        return [np.concatenate(parts) for parts in zip(*blocks)]
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def merge_runs(spill, key, width=None, memory=None):
+    """
+    Yields the rows of every run in `spill` in key order. heapq.merge is stable
+    across its inputs, so ties keep their spill order, like a stable sort.
+    More runs than fit in `memory` bytes at once (see merge_fan_in) are first
+    merged in passes into temporary spills.
+    """
+    fan_in = merge_fan_in(spill, memory)
+    sources = [(spill, run) for run in spill.runs]
+    # Temporary spills are written at full width, so they need no padding.
+    temporaries = []
+    try:
+        while len(sources) > fan_in:
+            merged = []
+            for i in range(0, len(sources), fan_in):
+                batch = sources[i:i + fan_in]
+                out = SpillFile(f"{spill.path}.pass{len(temporaries)}", spill.block_rows)
+                temporaries.append(out)
+                out.append_run(heapq.merge(*(s.iter_run(run, width) for s, run in batch), key=key))
+                merged.extend((out, run) for run in out.runs)
+            sources = merged
+        yield from heapq.merge(*(s.iter_run(run, width) for s, run in sources), key=key)
+    finally:
+        for tmp in temporaries:
+            tmp.remove()
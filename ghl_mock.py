@@ -0,0 +1,179 @@
+"""
+Local stand-in for the GHL contacts API, for tests and upload benchmarks.
+
+    python -m ghl_mock --port 8765 --token T --rate 100 --interval 10
+    python -m cli contacts.xlsx -o out --ghl-url http://127.0.0.1:8765 --ghl-token T --ghl-location L
+
+Serves POST /contacts/upsert the way ghl_upload.py uses it: a bearer token,
+the Version header, and a JSON body with a locationId and an email or phone.
+It also serves GET /stats, over keep-alive HTTP/1.1. Contacts are kept in
+memory, keyed by location and email (else phone).
+
+Like the real API it enforces a burst limit per location (a 429 with
+Retry-After, plus X-RateLimit-* headers on every answer). It can also add
+latency and fail a share of requests with a 503. /stats counts requests,
+creates, updates, 429s and injected failures, as well as `duplicates`:
+upserts that changed nothing, i.e. contacts sent twice.
+"""
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import threading
+import collections
+
+class MockGhlServer:
+    """
+    Runs the stand-in on its own event loop thread; start() returns the base
+    URL. `fail_rate` is the share of upserts answered with a 503 and
+    `latency` the seconds each upsert takes.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, token=None, rate=100, interval=10.0,
+                 fail_rate=0.0, latency=0.0, seed=0):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.rate = rate
+        self.interval = interval
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.contacts = {}
+        self.windows = collections.defaultdict(collections.deque)
+        self.stats = collections.Counter()
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        return f"http://{self.host}:{self.port}"
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop = None
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readuntil(b"\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                method, path, _ = request_line.decode('latin-1').split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readuntil(b"\r\n")
+                    if line == b"\r\n":
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, extra, payload = await self._handle(method, path, headers, body)
+                data = json.dumps(payload).encode('utf-8')
+                lines = [f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}",
+                         "Content-Type: application/json", f"Content-Length: {len(data)}"]
+                lines += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _limit(self, location):
+        """Counts one request against the location's window. Returns (allowed, headers)."""
+        now = time.monotonic()
+        window = self.windows[location]
+        while window and window[0] <= now - self.interval:
+            window.popleft()
+        headers = {"X-RateLimit-Max": self.rate, "X-RateLimit-Interval-Milliseconds": int(self.interval * 1000)}
+        if len(window) >= self.rate:
+            headers["X-RateLimit-Remaining"] = 0
+            headers["Retry-After"] = max(1, math.ceil(window[0] + self.interval - now))
+            return False, headers
+        window.append(now)
+        headers["X-RateLimit-Remaining"] = self.rate - len(window)
+        return True, headers
+
+    async def _handle(self, method, path, headers, body):
+        self.stats["requests"] += 1
+        if method == "GET" and path == "/stats":
+            return 200, {}, dict(self.stats, contacts=len(self.contacts))
+        if method != "POST" or path != "/contacts/upsert":
+            return 404, {}, {"message": "Not found"}
+        if self.token is not None and headers.get("authorization") != f"Bearer {self.token}":
+            return 401, {}, {"message": "Invalid token"}
+        if not headers.get("version"):
+            return 400, {}, {"message": "Version header required"}
+        try:
+            contact = json.loads(body)
+        except ValueError:
+            return 400, {}, {"message": "Invalid JSON"}
+        location = contact.get("locationId")
+        if not location:
+            return 422, {}, {"message": "locationId is required"}
+        allowed, limit_headers = self._limit(location)
+        if not allowed:
+            self.stats["rate_limited"] += 1
+            return 429, limit_headers, {"message": "Too many requests"}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and self.random.random() < self.fail_rate:
+            self.stats["failed"] += 1
+            return 503, limit_headers, {"message": "Service unavailable"}
+        identity = contact.get("email", "").lower() or contact.get("phone")
+        if not identity:
+            return 422, limit_headers, {"message": "email or phone is required"}
+        key = (location, identity)
+        existing = self.contacts.get(key)
+        if existing is None:
+            self.stats["created"] += 1
+            record = self.contacts[key] = dict(contact, id=f"c{len(self.contacts) + 1}")
+            return 201, limit_headers, {"new": True, "contact": record}
+        if {k: v for k, v in existing.items() if k != "id"} == contact:
+            self.stats["duplicates"] += 1
+        self.stats["updated"] += 1
+        existing.update(contact)
+        return 200, limit_headers, {"new": False, "contact": existing}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ghl_mock", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token", help="Bearer token to require (default: any)")
+    parser.add_argument("--rate", type=int, default=100, help="Requests allowed per interval and location")
+    parser.add_argument("--interval", type=float, default=10.0, help="Rate-limit window, in seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of upserts answered with a 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each upsert takes")
+    args = parser.parse_args(argv)
+    server = MockGhlServer(args.host, args.port, args.token, args.rate, args.interval, args.fail_rate, args.latency)
+    print(f"Listening on {server.start()}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Uploading the GHL output to GoHighLevel (README option 3b).
+
+Contacts are read back from a finished ghl_<timestamp>.zip and upserted
+through the LeadConnector API (POST /contacts/upsert). The API takes one
+contact per request, so batching happens on this side. Requests go out from
+one asyncio loop over a small pool of keep-alive HTTP/1.1 connections:
+    - a sliding window keeps to the burst limit (by default 100 requests per
+      10 seconds per location), re-sized from the X-RateLimit-Max and
+      X-RateLimit-Interval-Milliseconds headers the API answers with;
+    - a 429 pauses every sender for its Retry-After;
+    - 429s, 5xx and dropped connections are retried with exponential backoff
+      and jitter;
+    - 400/409/422 answers reject that contact only. Any other error (a bad
+      token or location, say) stops the upload.
+Contacts go out in batches. Each batch's outcomes are committed to the job
+store's upload ledger before the next batch starts, so a stopped or crashed
+upload resumes without re-sending anything.
+
+A contact's ledger key is its email (else its phone, else a hash of the
+record), and the ledger keeps a digest of what was sent: an unchanged contact
+is never sent twice, while one whose fields changed is upserted again.
+Rejected contacts (and any still failing after the last retry) are listed in
+upload_errors_<timestamp>.csv.
+
+No HTTP library is needed. ghl_mock.py is a local stand-in for the API, for
+tests and benchmarks (`python benchmark.py upload`).
+"""
+import io
+import re
+import csv
+import ssl
+import json
+import time
+import random
+import asyncio
+import hashlib
+import zipfile
+import collections
+import urllib.parse
+from zip_stream import open_member
+from schema import GHL_COLUMNS
+
+DEFAULT_BASE_URL = "https://services.leadconnectorhq.com"
+API_VERSION = "2021-07-28"
+UPSERT_PATH = "/contacts/upsert"
+
+SENT = "sent"
+REJECTED = "rejected"
+FAILED = "failed"  # still failing after the last retry; not recorded, so sent again next time
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REJECT_STATUSES = {400, 409, 422}
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+# Schema fields with a contact attribute of their own; the rest of the GHL
+# output goes into custom fields keyed by the field name.
+STANDARD_FIELDS = {
+    'email': 'email',
+    'first_name': 'firstName',
+    'last_name': 'lastName',
+    'phone': 'phone',
+    'city': 'city',
+    'state': 'state',
+    'country': 'country',
+    'employer': 'companyName',
+    'employer_website': 'website'
+}
+
+class UploadError(Exception):
+    """The API refused the upload as a whole (authentication, wrong location or URL)."""
+
+class UploadSettings:
+    """Where and how fast to upload. `rate` requests are allowed per `interval` seconds."""
+
+    def __init__(self, token, location_id, base_url=DEFAULT_BASE_URL, concurrency=8, batch_size=200,
+                 rate=100, interval=10.0, max_retries=5, timeout=30.0):
+        self.token = token
+        self.location_id = location_id
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.rate = rate
+        self.interval = interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+def contact_payload(row, location_id):
+    """Builds the upsert body for one row of the GHL output ({header: text})."""
+    payload = {"locationId": location_id}
+    custom = []
+    for header, field in GHL_COLUMNS:
+        value = (row.get(header) or "").strip()
+        if not value:
+            continue
+        if field in STANDARD_FIELDS:
+            payload[STANDARD_FIELDS[field]] = value
+        else:
+            custom.append({"key": field, "field_value": value})
+    if custom:
+        payload["customFields"] = custom
+    return payload
+
+def payload_digest(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def ledger_key(payload):
+    email = payload.get("email")
+    if email:
+        return "email:" + email.lower()
+    phone = re.sub(r"\D", "", payload.get("phone", ""))
+    if phone:
+        return "phone:" + phone
+    return "hash:" + payload_digest(payload)
+
+def iter_archive_rows(path):
+    """Yields (member name, row) for every row of every CSV in a ghl_<timestamp>.zip."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            with open_member(archive, info) as f:
+                text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+                for row in csv.DictReader(text):
+                    yield info.filename, row
+
+def write_errors(path, errors):
+    """Writes the contacts that were not uploaded. Returns False (writing nothing) if there are none."""
+    if not errors:
+        return False
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["File", "Contact", "Status", "Error"])
+        writer.writerows(errors)
+    return True
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one host, at most `size` in use at a time."""
+
+    def __init__(self, base_url, size, timeout):
+        url = urllib.parse.urlsplit(base_url)
+        self.secure = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port or (443 if self.secure else 80)
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+        self.opened = 0
+
+    async def _connect(self):
+        self.opened += 1
+        context = ssl.create_default_context() if self.secure else None
+        return await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    async def request(self, method, path, body, headers):
+        """Returns (status, headers with lower-case names, body)."""
+        async with self.slots:
+            reused = bool(self.idle)
+            reader, writer = self.idle.pop() if reused else await self._connect()
+            try:
+                response = await asyncio.wait_for(self._exchange(reader, writer, method, path, body, headers),
+                                                  self.timeout)
+            except (ConnectionError, EOFError):
+                writer.close()
+                if not reused:
+                    raise
+                # The server closed the idle connection; that says nothing about this request.
+                reader, writer = await self._connect()
+                try:
+                    response = await asyncio.wait_for(self._exchange(reader, writer, method, path, body, headers),
+                                                      self.timeout)
+                except BaseException:
+                    writer.close()
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+            if response[1].get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self.idle.append((reader, writer))
+            return response
+
+    async def _exchange(self, reader, writer, method, path, body, headers):
+        lines = [f"{method} {self.prefix}{path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+        status = int((await reader.readuntil(b"\r\n")).split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        if "content-length" in response_headers:
+            data = await reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunks.append((await reader.readexactly(size + 2))[:-2])
+                if not size:
+                    break
+            data = b"".join(chunks)
+        else:
+            data = await reader.read()
+            response_headers["connection"] = "close"
+        return status, response_headers, data
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+class RateLimiter:
+    """
+    At most `rate` requests per `interval` seconds, as a sliding window like
+    GHL's burst limit. A request holds a slot from acquire() and is stamped
+    when release() sees its answer: the server counts it somewhere in between,
+    so the window here never frees a slot before the server's does.
+    block() holds every sender back, for a 429's Retry-After.
+    """
+
+    def __init__(self, rate, interval):
+        self.rate = rate
+        self.interval = interval
+        self.done = collections.deque()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.changed:
+            while True:
+                now = time.monotonic()
+                while self.done and self.done[0] <= now - self.interval:
+                    self.done.popleft()
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if len(self.done) + self.in_flight < self.rate:
+                        self.in_flight += 1
+                        return
+                    # With every slot in flight, wait for a release instead.
+                    wait = self.done[0] + self.interval - now if self.done else None
+                try:
+                    await asyncio.wait_for(self.changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self):
+        async with self.changed:
+            self.in_flight -= 1
+            self.done.append(time.monotonic())
+            self.changed.notify()
+
+    def observe(self, headers):
+        """Follows the limit the API reports, which may differ from the configured one."""
+        try:
+            if "x-ratelimit-max" in headers:
+                self.rate = max(1, int(headers["x-ratelimit-max"]))
+            if "x-ratelimit-interval-milliseconds" in headers:
+                self.interval = int(headers["x-ratelimit-interval-milliseconds"]) / 1000
+        except ValueError:
+            pass
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+def retry_after(headers):
+    try:
+        return max(0.0, float(headers["retry-after"]))
+    except (KeyError, ValueError):
+        return None
+
+def backoff(attempt):
+    delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class UploadResult:
+    """Counts for one upload run. `errors` holds (file, contact, status, error) for the review sheet."""
+
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.sent = 0
+        self.rejected = 0
+        self.failed = 0
+        self.requests = 0
+        self.retries = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.errors = []
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in
+                ("rows", "skipped", "sent", "rejected", "failed", "requests", "retries", "connections", "bytes_sent")}
+
+class GhlUploader:
+    """
+    Upserts GHL output rows not yet in the ledger of `store` (a JobStore).
+    One uploader runs one upload() at a time.
+    """
+
+    def __init__(self, settings, store):
+        self.settings = settings
+        self.store = store
+        self.headers = {
+            "Authorization": f"Bearer {settings.token}",
+            "Version": API_VERSION,
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        self.result = None
+        self.limiter = None
+
+    def upload(self, rows, on_batch=None):
+        """
+        Uploads `rows` ((file, row) pairs, see iter_archive_rows). `on_batch`
+        is called with the UploadResult after each batch is recorded, while no
+        request is in flight; it may block (to pause) or raise (to stop).
+        """
+        self.result = UploadResult()
+        asyncio.run(self._upload(rows, on_batch))
+        return self.result
+
+    async def _upload(self, rows, on_batch):
+        settings = self.settings
+        self.limiter = RateLimiter(settings.rate, settings.interval)
+        pool = ConnectionPool(settings.base_url, settings.concurrency, settings.timeout)
+        try:
+            batch = []
+            for source, row in rows:
+                batch.append((source, row))
+                if len(batch) == settings.batch_size:
+                    await self._send_batch(pool, batch, on_batch)
+                    batch = []
+            if batch:
+                await self._send_batch(pool, batch, on_batch)
+        finally:
+            self.result.connections += pool.opened
+            pool.close()
+
+    def _pending(self, batch):
+        """The (file, key, digest, payload) of the contacts in `batch` that still have to be sent."""
+        contacts = {}
+        for source, row in batch:
+            payload = contact_payload(row, self.settings.location_id)
+            key = ledger_key(payload)
+            # A contact repeated within the batch is sent once, as it last appears.
+            contacts[key] = (source, key, payload_digest(payload), payload)
+        recorded = self.store.uploaded(self.settings.location_id, [(key, digest) for _, key, digest, _ in
+                                                                   contacts.values()])
+        pending = [contact for contact in contacts.values() if contact[1:3] not in recorded]
+        self.result.skipped += len(batch) - len(pending)
+        return pending
+
+    async def _send_batch(self, pool, batch, on_batch):
+        result = self.result
+        result.rows += len(batch)
+        pending = self._pending(batch)
+        # A send that fails the upload lets the others finish: their answers
+        # are recorded before the error is raised, so a re-run skips them.
+        outcomes = await asyncio.gather(*(self._send(pool, payload) for _, _, _, payload in pending),
+                                        return_exceptions=True)
+        entries = []
+        failure = None
+        for (source, key, digest, _), outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException):
+                failure = failure or outcome
+                continue
+            status, contact_id, error = outcome
+            if status == SENT:
+                result.sent += 1
+            elif status == REJECTED:
+                result.rejected += 1
+            else:
+                result.failed += 1
+            if status != FAILED:
+                entries.append((key, digest, status, contact_id, error))
+            if error is not None:
+                result.errors.append((source, key.split(":", 1)[1], status, error))
+        self.store.record_uploads(self.settings.location_id, entries)
+        if failure is not None:
+            raise failure
+        if on_batch is not None:
+            on_batch(result)
+
+    async def _send(self, pool, payload):
+        """Upserts one contact. Returns (status, contact id, error)."""
+        if "email" not in payload and "phone" not in payload:
+            return REJECTED, None, "No email or phone"
+        body = json.dumps(payload).encode('utf-8')
+        error = None
+        for attempt in range(self.settings.max_retries + 1):
+            if attempt:
+                self.result.retries += 1
+                await asyncio.sleep(delay)
+            await self.limiter.acquire()
+            self.result.requests += 1
+            self.result.bytes_sent += len(body)
+            try:
+                status, headers, data = await pool.request("POST", UPSERT_PATH, body, self.headers)
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.LimitOverrunError) as e:
+                # OSError covers refused or reset connections.
+                error = f"{type(e).__name__}: {e}"
+                delay = backoff(attempt)
+                continue
+            finally:
+                await self.limiter.release()
+            self.limiter.observe(headers)
+            if 200 <= status < 300:
+                return SENT, self._contact_id(data), None
+            error = f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}"
+            if status in REJECT_STATUSES:
+                return REJECTED, None, error
+            if status not in RETRY_STATUSES:
+                raise UploadError(f"GHL refused the upload: {error}")
+            delay = retry_after(headers)
+            if delay is None:
+                delay = backoff(attempt)
+            if status == 429:
+                self.limiter.block(delay)
+        return FAILED, None, error
+
+    @staticmethod
+    def _contact_id(data):
+        try:
+            return json.loads(data)["contact"]["id"]
+        except (ValueError, KeyError, TypeError):
+            return None
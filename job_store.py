@@ -0,0 +1,206 @@
+"""
+Durable job queue.
+
+Every queued file is a row in a small SQLite database, together with a
+pickled checkpoint of its progress: the spill files written so far (one
+checkpoint per chunk read), the countries already packaged, and the state of
+the archives being streamed. After a stop or a crash the queue is reloaded and
+each unfinished file resumes from its last checkpoint.
+"""
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".bulk_data_cleaner")
+
+# queued -> running -> done -> archived; running jobs left behind by a stop or
+# crash are resumed, failed jobs are not retried automatically.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+ARCHIVED = "archived"
+
+UNFINISHED = (QUEUED, RUNNING)
+FINISHED = (DONE, SKIPPED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    timestamp TEXT,
+    destination TEXT,
+    work_dir TEXT,
+    checkpoint BLOB,
+    error TEXT,
+    created REAL,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS drops (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS locations (
+    value TEXT PRIMARY KEY,
+    canonical TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    location TEXT NOT NULL,
+    key TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    status TEXT,
+    contact_id TEXT,
+    error TEXT,
+    updated REAL,
+    PRIMARY KEY (location, key, digest)
+);
+"""
+
+class JobRecord:
+    def __init__(self, row):
+        (self.id, self.file_path, self.status, self.stage, self.timestamp, self.destination,
+         self.work_dir, checkpoint, self.error, self.created, self.updated) = row
+        self.checkpoint = pickle.loads(checkpoint) if checkpoint else {}
+
+    @property
+    def name(self):
+        return os.path.basename(self.file_path)
+
+class JobStore:
+    """
+    Thread-safe wrapper around the jobs table (plus the drops a watched folder
+    has already queued, the location normalization cache and the ledger of
+    contacts uploaded to GHL). Stage threads write checkpoints
+    concurrently, so every call takes the lock and commits on its own.
+    """
+
+    def __init__(self, root=STATE_DIR):
+        self.root = root
+        self.work_root = os.path.join(root, "work")
+        os.makedirs(self.work_root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(root, "jobs.sqlite3"), check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def _query(self, sql, args=()):
+        with self.lock:
+            return self.db.execute(sql, args).fetchall()
+
+    def _jobs(self, statuses):
+        marks = ",".join("?" * len(statuses))
+        rows = self._query(f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY id", statuses)
+        return [JobRecord(row) for row in rows]
+
+    def add(self, file_path):
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (file_path, status, created, updated) VALUES (?, ?, ?, ?)",
+                (file_path, QUEUED, now, now))
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return JobRecord(rows[0]) if rows else None
+
+    def unfinished(self):
+        return self._jobs(UNFINISHED)
+
+    def is_unfinished(self, file_path):
+        """Whether `file_path` already has a queued or running job."""
+        marks = ",".join("?" * len(UNFINISHED))
+        rows = self._query(f"SELECT 1 FROM jobs WHERE file_path = ? AND status IN ({marks})",
+                           (file_path, *UNFINISHED))
+        return bool(rows)
+
+    def visible(self):
+        """Every job that has not been archived, oldest first."""
+        return self._jobs(UNFINISHED + FINISHED)
+
+    def update(self, job_id, **fields):
+        if fields.get("checkpoint") is not None:
+            fields["checkpoint"] = pickle.dumps(fields["checkpoint"], protocol=pickle.HIGHEST_PROTOCOL)
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._query(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def archive_finished(self):
+        """Moves done, skipped and failed jobs to the archive. Returns how many."""
+        marks = ",".join("?" * len(FINISHED))
+        with self.lock:
+            cursor = self.db.execute(f"UPDATE jobs SET status = ?, updated = ? WHERE status IN ({marks})",
+                                     (ARCHIVED, time.time(), *FINISHED))
+            return cursor.rowcount
+
+    def is_ingested(self, path, size, mtime):
+        """Whether a watched drop with this size and mtime has already been queued."""
+        rows = self._query("SELECT 1 FROM drops WHERE path = ? AND size = ? AND mtime = ?", (path, size, mtime))
+        return bool(rows)
+
+    def mark_ingested(self, path, size, mtime):
+        self._query("INSERT OR REPLACE INTO drops (path, size, mtime) VALUES (?, ?, ?)", (path, size, mtime))
+
+    def locations(self, values):
+        """The stored location normalizations of `values`, as {value: (canonical, status)}."""
+        values = list(values)
+        found = {}
+        # Stays under SQLite's limit on bound parameters.
+        for start in range(0, len(values), 500):
+            batch = values[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            rows = self._query(f"SELECT value, canonical, status FROM locations WHERE value IN ({marks})", batch)
+            found.update((value, (canonical, status)) for value, canonical, status in rows)
+        return found
+
+    def save_locations(self, entries):
+        """Adds normalizations to the cache; existing (possibly hand-edited) rows are kept."""
+        if not entries:
+            return
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR IGNORE INTO locations (value, canonical, status) VALUES (?, ?, ?)",
+                                [(value, canonical, status) for value, (canonical, status) in entries.items()])
+            self.db.execute("COMMIT")
+
+    def uploaded(self, location, contacts):
+        """Which of the (key, digest) pairs in `contacts` the ledger of a GHL location already holds."""
+        contacts = set(contacts)
+        keys = sorted({key for key, _ in contacts})
+        found = set()
+        # Stays under SQLite's limit on bound parameters.
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            rows = self._query(f"SELECT key, digest FROM uploads WHERE location = ? AND key IN ({marks})",
+                               (location, *batch))
+            found.update(row for row in rows if row in contacts)
+        return found
+
+    def record_uploads(self, location, entries):
+        """Records upload outcomes, as (key, digest, status, contact_id, error) tuples, in one transaction."""
+        if not entries:
+            return
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO uploads (location, key, digest, status, contact_id, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(location, *entry, now) for entry in entries])
+            self.db.execute("COMMIT")
+
+    def remove(self, job_id):
+        self._query("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
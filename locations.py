@@ -0,0 +1,197 @@
+"""
+Mojibake repair and accent folding for the location columns (City, State,
+Country).
+
+Each chunk is factorized per column, so only the distinct values are
+inspected and the fixed values are mapped back onto the codes. Contact sheets
+repeat a few thousand cities millions of times, so this costs next to
+nothing. Canonical forms are kept in a bounded LRU cache for the life of the
+Processor. Values that were changed or flagged (anything non-ASCII or
+garbled) are also kept in the job store, so later runs look them up instead
+of recomputing them; plain ASCII values are cheap to check and are not
+stored. Editing (or adding) a row in the store's `locations` table
+overrides how that value is normalized from then on.
+
+Every value is given one of three statuses:
+    - understood: unchanged, nothing to report;
+    - repaired: mojibake fixed and/or accents folded;
+    - not understood: still garbled after repair (replacement characters,
+      leftover mojibake, "?" standing in for a letter).
+Repaired and not-understood values go on the file's review sheet
+(locations_<timestamp>.csv), with the number of rows that held them.
+"""
+import re
+import csv
+import threading
+import unicodedata
+import collections
+import numpy as np
+import pandas as pd
+
+UNDERSTOOD = "understood"
+REPAIRED = "repaired"
+NOT_UNDERSTOOD = "not understood"
+
+# Lead bytes of UTF-8 sequences as they look when misread as cp1252/latin-1.
+MOJIBAKE = re.compile("[Â-ô][\u0080-¿ŒœŠšŸŽžƒ"
+                      "ˆ˜–—‘-„†-•…‰‹›€™]")
+GARBLED = re.compile("�|[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]|\\w\\?\\w")
+# Letters NFKD does not decompose into a base letter and a combining mark.
+FOLD = str.maketrans({
+    "ß": "ss", "Æ": "AE", "æ": "ae", "Œ": "OE", "œ": "oe", "Ø": "O", "ø": "o",
+    "Ł": "L", "ł": "l", "Đ": "D", "đ": "d", "Ð": "D", "ð": "d", "Þ": "Th", "þ": "th", "ı": "i"
+})
+MAX_PASSES = 3  # text mangled more than this many times is left alone
+CACHE_SIZE = 100000  # distinct values kept in memory
+
+def repair_mojibake(text):
+    """Undoes UTF-8 text decoded as cp1252 or latin-1, possibly more than once."""
+    for _ in range(MAX_PASSES):
+        if not MOJIBAKE.search(text):
+            break
+        for encoding in ("cp1252", "latin-1"):
+            try:
+                text = text.encode(encoding).decode("utf-8")
+                break
+            except UnicodeError:
+                continue
+        else:
+            break
+    return text
+
+def fold_latin(ch):
+    """Strips the accents off a Latin letter; other scripts are returned as they are."""
+    if ch.isascii() or not unicodedata.name(ch, "").startswith("LATIN "):
+        return ch
+    return "".join(part for part in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(part))
+
+def fold_accents(text):
+    # Only Latin letters are folded: stripping the marks off Cyrillic й or ї
+    # changes the letter, and NFKD would split Hangul syllables into jamo.
+    folded = "".join(fold_latin(ch) for ch in text.translate(FOLD))
+    return unicodedata.normalize("NFC", folded)
+
+def normalize_location(value, fold=True):
+    """Returns (canonical value, status) for one cell value."""
+    if not isinstance(value, str) or value.isascii():
+        if isinstance(value, str) and GARBLED.search(value):
+            return value, NOT_UNDERSTOOD
+        return value, UNDERSTOOD
+    fixed = unicodedata.normalize("NFC", repair_mojibake(value))
+    # Checked before folding, which would turn leftover mojibake into plain letters.
+    if GARBLED.search(fixed) or MOJIBAKE.search(fixed):
+        return value, NOT_UNDERSTOOD
+    if fold:
+        fixed = fold_accents(fixed)
+    return fixed, UNDERSTOOD if fixed == value else REPAIRED
+
+def worth_storing(value, entry):
+    """Whether a normalization is kept in the job store: it changed the value or the value is not plain ASCII."""
+    return entry[1] != UNDERSTOOD or not value.isascii()
+
+class LocationNormalizer:
+    """
+    Normalizes location columns chunk by chunk. `fetch`, if given, takes a
+    list of raw values and returns the stored {value: (canonical, status)}
+    among them, typically JobStore.locations. The last `size` values looked
+    up are cached in memory; computed entries worth storing are collected in
+    `new` until take_new() hands them over. Accents are always folded, so
+    cached entries never depend on a setting.
+    """
+
+    def __init__(self, fetch=None, size=CACHE_SIZE):
+        self.fetch = fetch
+        self.size = size
+        self.cache = collections.OrderedDict()
+        self.new = {}
+        self.lock = threading.Lock()
+
+    def lookup_many(self, values):
+        """The (canonical, status) of each of `values`, in order."""
+        entries = {}
+        misses = []
+        with self.lock:
+            for value in values:
+                if not isinstance(value, str):
+                    entries[value] = (value, UNDERSTOOD)
+                elif value in self.cache:
+                    self.cache.move_to_end(value)
+                    entries[value] = self.cache[value]
+                else:
+                    misses.append(value)
+        if misses:
+            stored = self.fetch(misses) if self.fetch is not None else {}
+            with self.lock:
+                for value in misses:
+                    entry = stored.get(value)
+                    if entry is None:
+                        entry = normalize_location(value)
+                        if worth_storing(value, entry):
+                            self.new[value] = entry
+                    entries[value] = self.cache[value] = entry
+                while len(self.cache) > self.size:
+                    self.cache.popitem(last=False)
+        return [entries[value] for value in values]
+
+    def lookup(self, value):
+        return self.lookup_many([value])[0]
+
+    def take_new(self):
+        with self.lock:
+            new, self.new = self.new, {}
+        return new
+
+    def normalize_column(self, values, review=None, column=None):
+        """
+        Returns `values` with every distinct value replaced by its canonical
+        form. If `review` is given, the row count of each repaired or not
+        understood value is added to review[(column, value)].
+        """
+        codes, uniques = pd.factorize(values)
+        if not len(uniques):
+            return values
+        entries = self.lookup_many(list(uniques))
+        changed = [i for i, (canonical, status) in enumerate(entries) if status != UNDERSTOOD]
+        if not changed:
+            return values
+        if review is not None:
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            for i in changed:
+                key = (column, uniques[i])
+                review[key] = review.get(key, 0) + int(counts[i])
+        fixed = np.empty(len(uniques) + 1, dtype=object)
+        fixed[:-1] = [value if status == UNDERSTOOD else canonical
+                      for value, (canonical, status) in zip(uniques, entries)]
+        fixed[-1] = None
+        # Missing values have code -1, which picks the trailing None.
+        out = fixed[codes]
+        missing = codes < 0
+        if missing.any():
+            out[missing] = values[missing]
+        return out
+
+    def normalize_frame(self, df, columns, review=None):
+        """
+        Normalizes the columns of an object DataFrame named in `columns`
+        ({column: label for the review sheet}) in place; absent ones are skipped.
+        """
+        for column, label in columns.items():
+            if column in df.columns:
+                df[column] = self.normalize_column(df[column].to_numpy(dtype=object), review, label)
+        return df
+
+def write_review(path, review, normalizer):
+    """
+    Writes the review sheet: one row per repaired or not understood value,
+    most frequent first. Returns False (writing nothing) if there is none.
+    """
+    if not review:
+        return False
+    rows = sorted(review.items(), key=lambda item: (-item[1], item[0][0], str(item[0][1])))
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Column", "Value", "Normalized", "Status", "Rows"])
+        for (column, value), count in rows:
+            canonical, status = normalizer.lookup(value)
+            writer.writerow([column, value, canonical if status == REPAIRED else "", status, count])
+    return True
@@ -0,0 +1,152 @@
+"""
+Per-stage metrics and opt-in profiling.
+
+Each stage of a file (read, sort, zip) and each pool task (one country
+group) records wall time, CPU time, rows, bytes read and written, and the
+peak RSS of the process that ran it. A task also records the pid of its
+worker and how long it waited for one. When a file finishes, the report is
+written next to its output zips:
+    - report_<timestamp>.json holds everything;
+    - report_<timestamp>.csv holds one row per stage or task.
+
+Profiling is off unless a profile directory is set. Each stage and each pool
+task then runs under cProfile and dumps a .prof file there (pstats format,
+for `python -m pstats` or snakeviz). To sample instead, attach py-spy to the
+pids the report lists (`py-spy record --pid PID`).
+"""
+import os
+import sys
+import csv
+import json
+import time
+import cProfile
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_FIELDS = ["kind", "name", "country", "pid", "wall_s", "cpu_s", "wait_s", "rows", "rows_per_s",
+                 "bytes_read", "bytes_written", "peak_rss_mb", "sections"]
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class StageMetrics:
+    """
+    Counters for one stage of a file or one pool task. Stage threads share a
+    process, so CPU is measured with `clock` = time.thread_time by default;
+    pool tasks pass time.process_time. `sections` holds the wall time of
+    named steps inside the stage.
+    """
+
+    def __init__(self, name, clock=time.thread_time, **labels):
+        self.name = name
+        self.clock = clock
+        self.labels = labels
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.wait = None
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.sections = {}
+        self.peak_rss_mb = None
+        self.pid = os.getpid()
+        self._started = None
+
+    def start(self):
+        self._started = (time.perf_counter(), self.clock())
+
+    def stop(self):
+        wall, cpu = self._started
+        self.wall += time.perf_counter() - wall
+        self.cpu += self.clock() - cpu
+        self.peak_rss_mb = peak_rss_mb()
+
+    @contextlib.contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_section(name, time.perf_counter() - started)
+
+    def add_section(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def timed(self, iterable, name):
+        """Yields from `iterable`, adding the time spent producing each item to `name`."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_section(name, time.perf_counter() - started)
+                return
+            self.add_section(name, time.perf_counter() - started)
+            yield item
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            **self.labels,
+            "pid": self.pid,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "wait_s": None if self.wait is None else round(self.wait, 6),
+            "rows": self.rows,
+            "rows_per_s": round(self.rows / self.wall, 1) if self.wall else None,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "peak_rss_mb": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+            "sections": {name: round(seconds, 6) for name, seconds in self.sections.items()}
+        }
+
+@contextlib.contextmanager
+def profiled(path):
+    """Runs the block under cProfile and dumps the stats to `path`; a no-op if path is None."""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process; another stage has it.
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+
+def _csv_row(kind, record):
+    row = {field: record.get(field) for field in REPORT_FIELDS}
+    row["kind"] = kind
+    row["sections"] = ";".join(f"{name}={seconds:.3f}" for name, seconds in record["sections"].items())
+    return row
+
+def write_report(directory, timestamp, summary, stages, tasks):
+    """
+    Writes report_<timestamp>.json and .csv into `directory`. `stages` and
+    `tasks` are StageMetrics.as_dict() results. Returns the JSON path.
+    """
+    base = os.path.join(directory, f"report_{timestamp}")
+    with open(base + ".json", 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, stages=stages, tasks=tasks), f, indent=2, default=str)
+    with open(base + ".csv", 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows([_csv_row("stage", record) for record in stages]
+                         + [_csv_row("task", record) for record in tasks])
+    return base + ".json"
@@ -0,0 +1,87 @@
+"""
+Optional Parquet copies of the outputs (needs pyarrow).
+
+ParquetWriter takes the same sorted blocks as RollingCsvWriter and writes
+them to one `<country>.parquet` per output, in a `<output>_<timestamp>.parquet`
+folder next to the zips, so pandas/pyarrow/DuckDB can read the folder as a
+dataset. Cells hold the same text as the CSV cells (missing values become
+nulls), so zip codes and phone numbers keep their leading zeros. The sort
+key columns repeat a handful of values millions of times and are stored as
+dictionary columns; Parquet dictionary-encodes the rest page by page anyway.
+"""
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+ROW_GROUP_ROWS = 100000
+COMPRESSION = 'zstd'
+
+def parquet_available():
+    return pq is not None
+
+class ParquetWriter:
+    """
+    Writes DataFrame blocks to `filename` in `directory` as string columns,
+    `dictionary_columns` as dictionary<string>. Blocks are buffered into row
+    groups of ROW_GROUP_ROWS. The file is written under a temporary name and
+    renamed on close, so a re-run of the same country replaces it whole.
+    """
+
+    def __init__(self, directory, filename, header, dictionary_columns=()):
+        if pq is None:
+            raise ValueError("Parquet output needs the 'pyarrow' package")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self.partial = self.path + ".partial"
+        self.header = list(header)
+        self.schema = pa.schema([
+            (name, pa.dictionary(pa.int32(), pa.string()) if name in dictionary_columns else pa.string())
+            for name in self.header
+        ])
+        self.writer = pq.ParquetWriter(self.partial, self.schema, compression=COMPRESSION)
+        self.pending = []
+        self.pending_rows = 0
+
+    def _column(self, values, field):
+        # Same text as to_csv writes for an object column; missing values stay null.
+        missing = pd.isna(values)
+        text = [None if empty else value if isinstance(value, str) else str(value)
+                for value, empty in zip(values, missing)]
+        array = pa.array(text, type=pa.string())
+        return array.dictionary_encode() if pa.types.is_dictionary(field.type) else array
+
+    def _flush(self):
+        if self.pending:
+            self.writer.write_table(pa.concat_tables(self.pending), row_group_size=ROW_GROUP_ROWS)
+            self.pending = []
+            self.pending_rows = 0
+
+    def write_frame(self, df):
+        arrays = [self._column(df[name].to_numpy(dtype=object), field)
+                  for name, field in zip(self.header, self.schema)]
+        self.pending.append(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.pending_rows += len(df)
+        if self.pending_rows >= ROW_GROUP_ROWS:
+            self._flush()
+
+    def close(self):
+        """Finishes the file and returns its name."""
+        if self.writer is not None:
+            self._flush()
+            self.writer.close()
+            self.writer = None
+            os.replace(self.partial, self.path)
+        return [os.path.basename(self.path)]
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        for path in (self.partial, self.path):
+            if os.path.exists(path):
+                os.remove(path)
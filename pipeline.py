@@ -0,0 +1,787 @@
+"""
+The processing pipeline, without any GUI: reading, cleaning and spilling a
+sheet, sorting and packaging each country, and the persistent job queue.
+Both the Tk app (index.py) and the headless CLI (cli.py) drive a Processor.
+"""
+import os
+import threading
+import tempfile
+import time
+import shutil
+import itertools
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+import pandas as pd
+from readers import open_reader, source_archive, source_size, zip_members
+from external_sort import (BLOCK_ROWS, SPILL_EXPANSION, SpillFile, iter_blocks, merge_runs, row_key,
+                           spill_block_rows)
+from worker_pool import DEFAULT_CPU_PERCENT, RunControl, WorkerPool, wait_if_paused_or_stopped
+from scheduler import Stage, StagePipeline
+from cleaning import DEFAULT_JUNK_TOKENS, clean_frame, junk_pattern
+from csv_sink import RollingCsvWriter
+from parquet_sink import ParquetWriter, parquet_available
+from zip_stream import DEFAULT_LEVEL, DEFAULT_METHOD, ZipStreamWriter, compress_member
+from job_store import DONE, FAILED, RUNNING, SKIPPED, JobStore
+from metrics import StageMetrics, profiled, write_report
+from locations import LocationNormalizer, write_review
+from ghl_upload import GhlUploader, iter_archive_rows, write_errors
+from schema import DEFAULT_POSITIONS, KEY_FIELDS, ProjectionPlan, compile_plan
+
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_SORT_MEMORY_MB = 1024
+
+SORT_COLUMNS = ['Language', 'Occupation', 'Industry']
+
+# Output name -> file suffix
+OUTPUTS = {
+    'processed': "",
+    'rachInbox': "_rachInbox",
+    'ghl': "_ghl"
+}
+
+def project_columns(df, columns):
+    # A field the file lacks (source None) comes out as an empty column.
+    return pd.DataFrame({name: df[source].values if source is not None else [None] * len(df)
+                         for name, source in columns})
+
+def open_sinks(output, country, header, projection, output_dir, parquet_dirs=None):
+    """The CSV writer of one output, followed by its Parquet writer if parquet_dirs names a folder for it."""
+    sinks = [RollingCsvWriter(output_dir, f"{country}{OUTPUTS[output]}.csv", header)]
+    if parquet_dirs:
+        keys = set(KEY_FIELDS.values())
+        sinks.append(ParquetWriter(parquet_dirs[output], f"{country}{OUTPUTS[output]}.parquet", header,
+                                   [name for name, source in projection if source in keys]))
+    return sinks
+
+def write_outputs(df, country, projections, output_dir, sinks, parquet_dirs=None):
+    """
+    Appends one sorted block of a country group to every output's sinks,
+    opening them on the first block. An output whose projection fails is
+    deleted and skipped for the rest of the group.
+    """
+    for output in projections:
+        filename = f"{country}{OUTPUTS[output]}.csv"
+        if output in sinks and sinks[output] is None:
+            continue
+        try:
+            out_df = project_columns(df, projections[output])
+            if output not in sinks:
+                sinks[output] = open_sinks(output, country, list(out_df.columns), projections[output],
+                                           output_dir, parquet_dirs)
+            for sink in sinks[output]:
+                sink.write_frame(out_df)
+        except Exception as e:
+            print(f"[{output}] Skipped {filename}: {str(e)}")
+            for sink in sinks.get(output) or []:
+                sink.abort()
+            sinks[output] = None
+
+def process_group_external(country, spill, columns, projections, output_dir, memory_cap=None, metrics=None,
+                           parquet_dirs=None, merge_memory=None):
+    """
+    Sorts one country group and routes it to every output sink in a single pass,
+    so the country CSV never has to be read back to build the projections.
+    Groups whose estimated in-memory size exceeds memory_cap are k-way merged
+    from their sorted runs instead of being loaded whole; both paths write the
+    same bytes. Returns a mapping of output name -> written filenames (more
+    than one when an output rolled over into parts). The spill is left in
+    place; the caller removes it once the result has been checkpointed.
+    `metrics`, if given, counts the rows routed. With `parquet_dirs`
+    ({output: folder}) every output is also written there as Parquet.
+    `merge_memory` bounds the merge (memory_cap itself, unless that is 0 to
+    force the merge).
+    """
+    sinks = {}
+    try:
+        if memory_cap is None or spill.size() * SPILL_EXPANSION <= memory_cap:
+            df = pd.DataFrame(dict(zip(columns, spill.read_columns(len(columns)))), columns=columns)
+            sorted_df = df.sort_values(by=SORT_COLUMNS)
+            for start in range(0, max(len(sorted_df), 1), BLOCK_ROWS):
+                wait_if_paused_or_stopped()
+                write_outputs(sorted_df.iloc[start:start + BLOCK_ROWS], country, projections, output_dir, sinks,
+                              parquet_dirs)
+            if metrics is not None:
+                metrics.rows += len(sorted_df)
+        else:
+            key = row_key([columns.index(col) for col in SORT_COLUMNS])
+            merged = merge_runs(spill, key, len(columns), merge_memory or memory_cap)
+            for block in iter_blocks(merged, spill.block_rows):
+                wait_if_paused_or_stopped()
+                block_df = pd.DataFrame(block, columns=columns, dtype=object)
+                write_outputs(block_df, country, projections, output_dir, sinks, parquet_dirs)
+                if metrics is not None:
+                    metrics.rows += len(block_df)
+                if not any(sinks.values()):
+                    break
+    except Exception:
+        for output_sinks in sinks.values():
+            for sink in output_sinks or []:
+                sink.abort()
+        raise
+    # Only the CSV files (the first sink's) go on to be compressed.
+    return {output: [sink.close() for sink in output_sinks][0]
+            for output, output_sinks in sinks.items() if output_sinks is not None}
+
+def package_group(country, spill, columns, projections, output_dir, memory_cap=None,
+                  method=DEFAULT_METHOD, level=DEFAULT_LEVEL, submitted=None, profile_path=None,
+                  parquet_dirs=None, merge_memory=None):
+    """
+    Writes one country group's outputs and compresses them in the worker, so
+    compression is spread over the pool instead of running in one zip thread.
+    Returns a mapping of output name -> list of compressed members, and this
+    task's metrics. `submitted` is the time.time() the task was queued at;
+    `profile_path`, if given, receives a cProfile dump of the task.
+    Parquet copies, if asked for, are written straight to `parquet_dirs`.
+    `merge_memory` is the memory budget of an external merge.
+    """
+    metrics = StageMetrics("package", clock=time.process_time, country=country)
+    if submitted is not None:
+        metrics.wait = max(0.0, time.time() - submitted)
+    metrics.bytes_read = spill.size()
+    metrics.start()
+    with profiled(profile_path):
+        with metrics.section("sort_write"):
+            written = process_group_external(country, spill, columns, projections, output_dir, memory_cap,
+                                             metrics, parquet_dirs, merge_memory)
+        with metrics.section("compress"):
+            members = {
+                output: [compress_member(os.path.join(output_dir, file), file, method, level) for file in files]
+                for output, files in written.items()
+            }
+    metrics.stop()
+    metrics.bytes_written = sum(member["compressed_size"] for group in members.values() for member in group)
+    return members, metrics.as_dict()
+
+class FileJob:
+    """
+    State of one queued file as it moves through the read, sort, zip and upload stages.
+    `checkpoint` is the part of it the job store persists, so an interrupted
+    file can be resumed.
+    """
+
+    def __init__(self, file_path, timestamp, job_id=None, checkpoint=None):
+        self.file_path = file_path
+        self.name = os.path.basename(file_path)
+        self.timestamp = timestamp
+        self.id = job_id
+        self.checkpoint = checkpoint or {}
+        self.destination = None
+        self.temp_dir = None
+        self.columns = None
+        self.has_content = None
+        self.plan = None
+        self.spills = {}
+        self.locations = {}  # (column, raw value) -> rows, for the review sheet
+        self.written = {output: [] for output in OUTPUTS}
+        self.archives = {}
+        self.stage = "queued"
+        self.progress = 0
+        # Metrics cover this run only; a resumed file reports the work left.
+        self.resumed = bool(self.checkpoint)
+        self.started = None
+        self.metrics = {}
+        self.tasks = []
+        self.upload = None
+
+    def stage_metrics(self, name):
+        if name not in self.metrics:
+            self.metrics[name] = StageMetrics(name)
+        return self.metrics[name]
+
+class Processor:
+    """
+    Runs queued files through the read, sort, zip and upload stages. `reporter` takes
+    set_status(text) and set_progress(percent) calls from the stage threads.
+    Front ends override the on_queue_* hooks.
+    """
+
+    def __init__(self, reporter, store=None):
+        # The queue lives in the job store, so it survives stops, errors and restarts.
+        self.store = store if store is not None else JobStore()
+        self.queue = [record.id for record in self.store.unfinished()]
+        self.processing = False
+        # Pause/stop are events the stage threads and pool workers wait on.
+        self.control = RunControl()
+        self.reporter = reporter
+        self.save_dir = None
+        self.chunk_rows = DEFAULT_CHUNK_ROWS
+        self.chunk_bytes = None
+        self.read_backend = 'auto'
+        self.sort_mode = 'auto'  # 'auto', 'memory' or 'external'
+        self.sort_memory_mb = DEFAULT_SORT_MEMORY_MB
+        self.junk_tokens = list(DEFAULT_JUNK_TOKENS)
+        self.zip_method = DEFAULT_METHOD  # 'stored', 'deflate' or 'zstd'
+        self.zip_level = DEFAULT_LEVEL
+        self.outputs = list(OUTPUTS)
+        # Also write every output as Parquet (needs pyarrow); see parquet_sink.py.
+        self.parquet_outputs = False
+        # A JSON/CSV run report is written next to each file's zips; with
+        # profile_dir set every stage and pool task is also run under cProfile.
+        self.write_reports = True
+        self.profile_dir = None
+        # City/State/Country mojibake repair; see locations.py.
+        self.normalize_locations = True
+        self.locations = LocationNormalizer(self.store.locations)
+        # ghl_upload.UploadSettings to also upload the GHL output (README option 3b).
+        self.ghl_upload = None
+        self.pool = WorkerPool(DEFAULT_CPU_PERCENT, self.control)
+        # Per-stage concurrency: reading is GIL-bound Python, sorting and
+        # compression fan out to the pool, and the zip stage only finalizes the
+        # archives. capacity is how many jobs may wait in front of a stage
+        # before the previous one blocks.
+        self.stage_limits = {
+            'read': {'workers': 1, 'capacity': 1},
+            'sort': {'workers': 2, 'capacity': 1},
+            'zip': {'workers': 1, 'capacity': 2},
+            # One upload at a time: the rate limit is per GHL location, not per file.
+            'upload': {'workers': 1, 'capacity': 2}
+        }
+        self.jobs_lock = threading.Lock()
+        self.active_jobs = {}
+        self.finished_jobs = 0
+        self.started_jobs = []
+        self.last_timestamp = None
+        self.timestamp_count = 1
+
+
+    def enqueue(self, file_path):
+        """Queues a file unless it already has a queued or running job. Returns whether it was queued."""
+        if self.store.is_unfinished(file_path):
+            return False
+        self.queue.append(self.store.add(file_path))
+        self.on_queue_changed()
+        return True
+
+    def enqueue_zip(self, zip_path):
+        """
+        Queues every .xlsx/.csv inside a ZIP (and the ZIPs nested in it) as a
+        member reference; the readers stream members out of the archive when
+        the job runs, so nothing is extracted. Returns how many were queued;
+        members that are already queued are left alone.
+        """
+        return sum(self.enqueue(member) for member in zip_members(zip_path))
+
+    def clear_queue(self):
+        """Drops every unfinished job, including its checkpoint and partial archives."""
+        for record in self.store.unfinished():
+            if record.work_dir:
+                shutil.rmtree(record.work_dir, ignore_errors=True)
+            for state in record.checkpoint.get("sort", {}).get("archives", {}).values():
+                if os.path.exists(state["path"]):
+                    os.remove(state["path"])
+            self.store.remove(record.id)
+        self.queue = []
+        self.on_queue_changed()
+
+    def wait_if_paused_or_stopped(self):
+        self.control.wait_if_paused_or_stopped()
+
+    def next_timestamp(self):
+        # Files now finish concurrently, so make sure two never share an output name.
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if timestamp == self.last_timestamp:
+            self.timestamp_count += 1
+            return f"{timestamp}-{self.timestamp_count}"
+        self.last_timestamp = timestamp
+        self.timestamp_count = 1
+        return timestamp
+
+    def iter_queue(self):
+        while self.queue and not self.control.stopped:
+            try:
+                self.wait_if_paused_or_stopped()
+            except Exception:
+                return
+            record = self.store.get(self.queue.pop(0))
+            if record is None:
+                continue
+            job = FileJob(record.file_path, record.timestamp or self.next_timestamp(), record.id,
+                          record.checkpoint)
+            job.destination = (record.destination or self.save_dir
+                               or os.path.dirname(source_archive(record.file_path)))
+            job.temp_dir = record.work_dir or os.path.join(self.store.work_root, f"job_{record.id}")
+            self.store.update(job.id, status=RUNNING, timestamp=job.timestamp,
+                              destination=job.destination, work_dir=job.temp_dir)
+            self.started_jobs.append(job)
+            self.on_queue_changed()
+            yield job
+
+    def save_checkpoint(self, job):
+        if job.id is not None:
+            self.store.update(job.id, stage=job.stage, checkpoint=job.checkpoint)
+
+    def finish_job(self, job, status, error=None):
+        if job.id is not None:
+            self.store.update(job.id, status=status, stage=job.stage, checkpoint=None, error=error)
+            self.on_queue_changed()
+
+    def report(self, job, stage=None, progress=None):
+        """Records a job's stage/progress and refreshes the status line and progress bar."""
+        with self.jobs_lock:
+            if stage is not None:
+                job.stage = stage
+            if progress is not None:
+                job.progress = progress
+            self.active_jobs[job.file_path] = job
+            if job.stage in ("done", "skipped", "failed"):
+                del self.active_jobs[job.file_path]
+                self.finished_jobs += 1
+            active = list(self.active_jobs.values())
+            total = self.finished_jobs + len(active)
+            overall = (self.finished_jobs * 100 + sum(j.progress for j in active)) / total if total else 0
+
+        if active:
+            self.reporter.set_status(" | ".join(f"{j.name}: {j.stage} {j.progress}%" for j in active))
+        else:
+            self.reporter.set_status(f"{job.name} {job.stage}")
+        self.reporter.set_progress(int(overall))
+
+    def on_job_error(self, job, stage, error):
+        with self.jobs_lock:
+            self.active_jobs.pop(job.file_path, None)
+        self.reporter.set_status(f"{job.name} ({stage.name}): {error}")
+        if self.control.stopped:
+            # Interrupted, not failed: keep the checkpoint to resume from.
+            return
+        job.stage = "failed"
+        self.abort_archives(job)
+        if job.temp_dir:
+            shutil.rmtree(job.temp_dir, ignore_errors=True)
+        self.finish_job(job, FAILED, str(error))
+        self.write_run_report(job, FAILED, str(error))
+
+    def process_queue(self):
+        self.active_jobs = {}
+        self.finished_jobs = 0
+        self.started_jobs = []
+        pipeline = StagePipeline([
+            Stage("read", self.measured("read", self.read_stage), **self.stage_limits['read']),
+            Stage("sort", self.measured("sort", self.sort_stage), **self.stage_limits['sort']),
+            Stage("zip", self.measured("zip", self.zip_stage), **self.stage_limits['zip']),
+            Stage("upload", self.measured("upload", self.upload_stage), **self.stage_limits['upload'])
+        ], on_error=self.on_job_error, should_stop=lambda: self.control.stopped)
+        ok = pipeline.run(self.iter_queue())
+
+        if self.control.stopped:
+            self.reporter.set_status("All tasks cancelled")
+        elif ok:
+            self.reporter.set_status("All tasks completed")
+        self.processing = False
+
+        # Jobs abandoned mid-pipeline keep their work directory and partial
+        # archives; the next run resumes them from their checkpoint.
+        for job in self.started_jobs:
+            for archive in job.archives.values():
+                archive.suspend()
+            job.archives.clear()
+        self.queue = [record.id for record in self.store.unfinished()]
+        self.on_queue_finished()
+        return ok
+
+    def on_queue_changed(self):
+        """Called (from any thread) when a job is queued, started or finished."""
+
+    def on_queue_finished(self):
+        """Called from the processing thread once process_queue has drained."""
+
+    def read_excel_chunks(self, file_path, on_progress=None, start=0, layout=None, usecols=None, reader=None):
+        """
+        Yields the active sheet as DataFrames of at most self.chunk_rows rows.
+        If self.chunk_bytes is set, the row count is re-derived from the in-memory
+        size of the first chunk so each chunk stays within that byte budget.
+        on_progress, if given, is called with the fraction of rows read so far.
+        `start` skips rows already read; `layout` carries the chunk size and
+        width from the first run of a resumed file and is filled in otherwise.
+        The width only grows: every chunk has as many columns as the widest row
+        seen so far, so ragged rows never lose cells.
+        Chunk columns are labelled with their source column index; `usecols`
+        limits them to those columns. `reader`, if given, is an open reader for
+        file_path, closed like one opened here.
+        """
+        if layout is None:
+            layout = {}
+        layout.setdefault("chunk_rows", self.chunk_rows)
+        layout.setdefault("width", None)
+        if reader is None:
+            reader = open_reader(file_path, self.read_backend)
+        max_rows = reader.max_row
+        rows = []
+
+        def frame(rows):
+            if usecols is not None:
+                return pd.DataFrame(rows, columns=usecols, dtype=object)
+            chunk = pd.DataFrame(rows, dtype=object)
+            width = max(layout["width"] or 0, chunk.shape[1])
+            return chunk if chunk.shape[1] == width else chunk.reindex(columns=range(width))
+
+        try:
+            for i, row in enumerate(reader.iter_rows(start, usecols), start=start + 1):
+                self.wait_if_paused_or_stopped()
+                rows.append(row)
+                if on_progress and max_rows and (i % 1000 == 0 or i == max_rows):
+                    on_progress(i / max_rows)
+
+                if len(rows) >= layout["chunk_rows"]:
+                    chunk = frame(rows)
+                    rows = []
+                    if layout["width"] is None and self.chunk_bytes:
+                        row_bytes = max(1, chunk.memory_usage(deep=True).sum() // len(chunk))
+                        layout["chunk_rows"] = max(1, self.chunk_bytes // row_bytes)
+                    layout["width"] = chunk.shape[1]
+                    yield chunk
+
+            if rows:
+                chunk = frame(rows)
+                layout["width"] = chunk.shape[1]
+                yield chunk
+        finally:
+            reader.close()
+
+    def plan_for(self, reader):
+        """Compiles the projection plan from the sheet's first row; see schema.py."""
+        rows = reader.iter_rows()
+        try:
+            first_row = next(rows, None)
+        finally:
+            rows.close()
+        return compile_plan(first_row, self.outputs)
+
+    def prepare_chunk(self, df, plan):
+        """
+        Names the source columns by `plan`, blanks junk cells and reports which
+        columns have content in this chunk.
+        """
+        df.columns = [plan.column_name(i) for i in df.columns]
+        return clean_frame(df, junk_pattern(self.junk_tokens))
+
+    def process_file(self, file_path):
+        """Runs every stage for a single file on the calling thread."""
+        job = FileJob(file_path, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        job.destination = self.save_dir or os.path.dirname(source_archive(file_path))
+        job.temp_dir = tempfile.mkdtemp()
+        for name, stage in (("read", self.read_stage), ("sort", self.sort_stage), ("zip", self.zip_stage),
+                            ("upload", self.upload_stage)):
+            self.measured(name, stage)(job)
+
+    def measured(self, name, stage):
+        """
+        Wraps a stage so its wall/CPU time and peak RSS are recorded on the job
+        (and it is profiled if profile_dir is set). The run report is written
+        once the file is done.
+        """
+        def run(job):
+            if job.stage in ("done", "skipped"):
+                # Skipped, or finished without an upload: nothing is left to run or report.
+                return
+            if job.started is None:
+                job.started = time.time()
+            metrics = job.stage_metrics(name)
+            metrics.start()
+            try:
+                with profiled(self.profile_path(job, name)):
+                    stage(job)
+            finally:
+                metrics.stop()
+            if job.stage == "done":
+                self.write_run_report(job, DONE)
+        return run
+
+    def profile_path(self, job, name):
+        if not self.profile_dir:
+            return None
+        return os.path.join(self.profile_dir, f"{job.timestamp}_{name}.prof")
+
+    def write_run_report(self, job, status, error=None):
+        if not self.write_reports or job.started is None:
+            return
+        summary = {
+            "file": job.file_path,
+            "timestamp": job.timestamp,
+            "status": status,
+            "error": error,
+            "resumed": job.resumed,
+            "wall_s": round(time.time() - job.started, 6),
+            "settings": {
+                "read_backend": self.read_backend,
+                "chunk_rows": self.chunk_rows,
+                "chunk_bytes": self.chunk_bytes,
+                "sort_mode": self.sort_mode,
+                "sort_memory_mb": self.sort_memory_mb,
+                "zip_method": self.zip_method,
+                "zip_level": self.zip_level,
+                "parquet_outputs": self.parquet_outputs,
+                "ghl_upload": self.ghl_upload is not None,
+                "cpu_percent": self.pool.cpu_percent,
+                "max_workers": self.pool.max_workers
+            },
+            "schema": job.plan.describe() if job.plan is not None else None,
+            "upload": job.upload
+        }
+        stages = [metrics.as_dict() for metrics in job.metrics.values()]
+        try:
+            os.makedirs(job.destination, exist_ok=True)
+            write_report(job.destination, job.timestamp, summary, stages, job.tasks)
+        except OSError as e:
+            print(f"Could not write the run report for {job.name}: {e}")
+
+    def restore_spills(self, job, read):
+        """
+        Puts a resumed job's work directory back to its last checkpoint: spills
+        are truncated to their checkpointed size and anything written after
+        the checkpoint (newer spills, CSVs, compressed members) is deleted.
+        """
+        sorted_countries = job.checkpoint.get("sort", {}).get("done", set())
+        # Checkpoints written before plans existed used the default layout.
+        job.plan = read.get("plan") or ProjectionPlan(dict(DEFAULT_POSITIONS), False, self.outputs)
+        job.columns = read["columns"]
+        job.has_content = read["has_content"]
+        job.locations = dict(read.get("locations", {}))
+        job.spills = {country: spill for country, spill in read["spills"].items()
+                      if country not in sorted_countries}
+        keep = set()
+        for country, spill in job.spills.items():
+            with open(spill.path, 'ab') as f:
+                f.truncate(read["sizes"][country])
+            keep.add(os.path.basename(spill.path))
+        for name in os.listdir(job.temp_dir):
+            if name not in keep:
+                os.remove(os.path.join(job.temp_dir, name))
+
+    def read_stage(self, job):
+        if "upload" in job.checkpoint:
+            # Interrupted while uploading: the outputs are finished.
+            return
+        os.makedirs(job.temp_dir, exist_ok=True)
+        read = job.checkpoint.get("read")
+        if read is not None:
+            self.restore_spills(job, read)
+            if read["complete"]:
+                self.report(job, "waiting to sort", 50)
+                return
+            start, layout = read["rows"], dict(read["layout"])
+            reader = None
+        else:
+            for name in os.listdir(job.temp_dir):
+                os.remove(os.path.join(job.temp_dir, name))
+            # The plan is compiled once per file, from the same open reader.
+            reader = open_reader(job.file_path, self.read_backend)
+            try:
+                job.plan = self.plan_for(reader)
+            except Exception as e:
+                reader.close()
+                if not isinstance(e, IndexError):
+                    raise
+                self.skip_job(job, f"Column index error: {e}")
+                return
+            # A header row is not data; counting it as read keeps resuming simple.
+            start, layout = (1 if job.plan.header else 0), {}
+        self.report(job, "reading", 0)
+        metrics = job.stage_metrics("read")
+        metrics.bytes_read = source_size(job.file_path)
+
+        # Each chunk is cleaned, sorted and spilled per country as a sorted run,
+        # so only one chunk of the sheet is held in memory while reading. After
+        # every chunk the spills are checkpointed, so a resumed file skips the
+        # rows it has already spilled.
+        on_progress = lambda fraction: self.report(job, progress=int(fraction * 50))
+        chunks = self.read_excel_chunks(job.file_path, on_progress, start, layout, job.plan.usecols, reader)
+        for chunk in metrics.timed(chunks, "parse"):
+            start += len(chunk)
+            metrics.rows += len(chunk)
+            with metrics.section("clean"):
+                chunk, has_content = self.prepare_chunk(chunk, job.plan)
+            if self.normalize_locations:
+                with metrics.section("normalize"):
+                    self.locations.normalize_frame(chunk, job.plan.location_columns, job.locations)
+            job.columns = list(chunk.columns)
+            if job.has_content is not None:
+                # A wider chunk adds columns the earlier ones did not have.
+                has_content[:len(job.has_content)] |= job.has_content
+            job.has_content = has_content
+            with metrics.section("spill"):
+                block_rows = None
+                for country, group in chunk.groupby('Country'):
+                    if country not in job.spills:
+                        if block_rows is None:
+                            # Small enough blocks that merging the spill later stays within the cap.
+                            row_bytes = chunk.memory_usage(deep=True).sum() / max(1, len(chunk))
+                            block_rows = spill_block_rows(self.merge_memory(), row_bytes)
+                        path = os.path.join(job.temp_dir, f"spill_{len(job.spills)}.bin")
+                        job.spills[country] = SpillFile(path, block_rows)
+                    job.spills[country].append_frame(group.sort_values(by=SORT_COLUMNS))
+            with metrics.section("checkpoint"):
+                self.checkpoint_read(job, start, layout, complete=False)
+        self.checkpoint_read(job, start, layout, complete=True)
+        self.store.save_locations(self.locations.take_new())
+        metrics.bytes_written = sum(job.checkpoint["read"]["sizes"].values())
+        self.report(job, "waiting to sort", 50)
+
+    def merge_memory(self):
+        """Memory budget of an external merge, in bytes (None when every group is sorted in memory)."""
+        return None if self.sort_mode == 'memory' else self.sort_memory_mb * 1024 * 1024
+
+    def skip_job(self, job, reason):
+        shutil.rmtree(job.temp_dir)
+        job.temp_dir = None
+        self.report(job, "skipped")
+        self.finish_job(job, SKIPPED, reason)
+        self.reporter.set_status(reason)
+
+    def checkpoint_read(self, job, rows, layout, complete):
+        job.checkpoint["read"] = {
+            "rows": rows,
+            "layout": dict(layout),
+            "plan": job.plan,
+            "columns": job.columns,
+            "has_content": job.has_content,
+            "locations": dict(job.locations),
+            "spills": job.spills,
+            "sizes": {country: spill.size() for country, spill in job.spills.items()},
+            "complete": complete
+        }
+        self.save_checkpoint(job)
+
+    def sort_stage(self, job):
+        if job.stage == "skipped" or "upload" in job.checkpoint:
+            return
+        if self.sort_mode == 'memory':
+            memory_cap = None
+        elif self.sort_mode == 'external':
+            memory_cap = 0
+        else:
+            memory_cap = self.sort_memory_mb * 1024 * 1024
+
+        # Countries already packaged by an earlier run are in the checkpoint,
+        # together with the archives they were streamed into.
+        sort = job.checkpoint.setdefault("sort", {"done": set(), "archives": {},
+                                                  "written": {output: [] for output in job.plan.outputs},
+                                                  "parquet": self.parquet_outputs})
+        job.written = sort["written"]
+        # A resumed file keeps the formats it was started with.
+        parquet_dirs = None
+        if sort.get("parquet"):
+            if not parquet_available():
+                raise RuntimeError("Parquet output needs the 'pyarrow' package")
+            parquet_dirs = {output: self.parquet_path(job, output) for output in job.plan.outputs}
+        for output, state in sort["archives"].items():
+            job.archives[output] = ZipStreamWriter.resume(state)
+
+        self.report(job, "processing by country")
+        metrics = job.stage_metrics("sort")
+        projections = job.plan.projections(job.columns, job.has_content)
+        # Compressed members are streamed into the archives in the destination
+        # folder as each country finishes, while the rest are still being
+        # submitted; there is no temporary zip to move. At most max_workers
+        # countries are in flight, so a stop loses only those.
+        total = len(job.spills) + len(sort["done"])
+        countries = enumerate(list(job.spills.items()))
+        in_flight = {}
+        try:
+            while True:
+                room = max(0, self.pool.max_workers - len(in_flight))
+                for index, (country, spill) in itertools.islice(countries, room):
+                    self.wait_if_paused_or_stopped()
+                    metrics.bytes_read += spill.size()
+                    profile_path = self.profile_path(job, f"package_{index}")
+                    with metrics.section("submit"):
+                        future = self.pool.submit(package_group, country, spill, job.columns, projections,
+                                                  job.temp_dir, memory_cap, self.zip_method, self.zip_level,
+                                                  time.time(), profile_path, parquet_dirs, self.merge_memory(),
+                                                  should_stop=lambda: self.control.stopped)
+                    in_flight[future] = country
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for f in done:
+                    self.wait_if_paused_or_stopped()
+                    country = in_flight.pop(f)
+                    packaged, task = f.result()
+                    job.tasks.append(task)
+                    metrics.rows += task["rows"]
+                    with metrics.section("archive"):
+                        for output, members in packaged.items():
+                            if output not in job.archives:
+                                job.archives[output] = ZipStreamWriter(self.archive_path(job, output))
+                            for member in members:
+                                job.archives[output].add(member)
+                                job.written[output].append(member["arcname"])
+                                metrics.bytes_written += member["compressed_size"]
+                    sort["done"].add(country)
+                    sort["archives"] = {output: archive.state() for output, archive in job.archives.items()}
+                    with metrics.section("checkpoint"):
+                        self.save_checkpoint(job)
+                    job.spills.pop(country).remove()
+                    self.report(job, progress=50 + int((len(sort["done"]) / total) * 45))
+        finally:
+            # On a stop or an error, don't leave queued countries to run in the pool.
+            for f in in_flight:
+                f.cancel()
+        self.report(job, "waiting to zip", 95)
+
+    def zip_stage(self, job):
+        if job.stage == "skipped" or "upload" in job.checkpoint:
+            return
+        self.report(job, "zipping")
+        for output in job.written:
+            # Every output gets an archive, even if no country produced it.
+            archive = job.archives.pop(output, None) or ZipStreamWriter(self.archive_path(job, output))
+            archive.close()
+            job.stage_metrics("zip").bytes_written += os.path.getsize(archive.path)
+        write_review(os.path.join(job.destination, f"locations_{job.timestamp}.csv"), job.locations, self.locations)
+
+        shutil.rmtree(job.temp_dir)
+        if self.ghl_upload is not None and 'ghl' in job.written:
+            # The upload stage reads the contacts back from the finished archive.
+            job.checkpoint["upload"] = {"archive": self.archive_path(job, 'ghl')}
+            self.report(job, "waiting to upload", 96)
+            self.save_checkpoint(job)
+            return
+        self.report(job, "done", 100)
+        self.finish_job(job, DONE)
+
+    def upload_stage(self, job):
+        upload = job.checkpoint.get("upload")
+        if job.stage == "skipped" or upload is None:
+            return
+        if self.ghl_upload is None:
+            # Resumed without upload settings; the archives are all there.
+            self.report(job, "done", 100)
+            self.finish_job(job, DONE, "GHL upload not configured; contacts were not uploaded")
+            return
+        self.report(job, "uploading", 96)
+        metrics = job.stage_metrics("upload")
+        metrics.bytes_read = os.path.getsize(upload["archive"])
+
+        # Every batch is in the upload ledger before the next one starts, so
+        # pausing or stopping between batches never loses or repeats a contact.
+        def on_batch(result):
+            metrics.rows = result.rows
+            self.wait_if_paused_or_stopped()
+
+        result = GhlUploader(self.ghl_upload, self.store).upload(iter_archive_rows(upload["archive"]), on_batch)
+        metrics.rows = result.rows
+        metrics.bytes_written = result.bytes_sent
+        job.upload = result.as_dict()
+        write_errors(os.path.join(job.destination, f"upload_errors_{job.timestamp}.csv"), result.errors)
+        self.report(job, "done", 100)
+        error = None
+        if result.failed:
+            error = f"{result.failed} contacts could not be uploaded; queue the file again to retry them"
+        self.finish_job(job, DONE, error)
+
+    def archive_path(self, job, output):
+        os.makedirs(job.destination, exist_ok=True)
+        return os.path.join(job.destination, f"{output}_{job.timestamp}.zip")
+
+    def parquet_path(self, job, output):
+        return os.path.join(job.destination, f"{output}_{job.timestamp}.parquet")
+
+    def abort_archives(self, job):
+        """Deletes the partially written archives (and Parquet folders) of a failed or cancelled job."""
+        for archive in job.archives.values():
+            archive.abort()
+        job.archives.clear()
+        # A file that failed while uploading keeps its finished outputs.
+        if job.plan is not None and job.destination and "upload" not in job.checkpoint:
+            for output in job.plan.outputs:
+                shutil.rmtree(self.parquet_path(job, output), ignore_errors=True)
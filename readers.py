@@ -0,0 +1,467 @@
+import io
+import os
+import csv
+import zipfile
+import operator
+import itertools
+import posixpath
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+from datetime import date, datetime
+from openpyxl import load_workbook
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import from_excel, CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Namespace as expat reports it (namespace_separator=" ") and as ElementTree does.
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+MAIN_NS_TAG = "{" + MAIN_NS + "}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Separates an archive from a member inside it. Nested archives chain, e.g.
+# "drop.zip!/2024/batch.zip!/contacts.xlsx".
+MEMBER_SEPARATOR = "!/"
+SOURCE_EXTENSIONS = ('.xlsx', '.csv')
+
+def member_path(archive, member):
+    return f"{archive}{MEMBER_SEPARATOR}{member}"
+
+def is_member(path):
+    return MEMBER_SEPARATOR in path
+
+def source_archive(path):
+    """The file on disk that holds `path` (the path itself unless it is a member)."""
+    return path.split(MEMBER_SEPARATOR)[0]
+
+def source_size(path):
+    """Uncompressed size in bytes of a file or zip member reference."""
+    parent, sep, member = path.rpartition(MEMBER_SEPARATOR)
+    if not sep:
+        return os.path.getsize(path)
+    with SourceStream(parent) as stream, zipfile.ZipFile(stream.file) as zf:
+        return zf.getinfo(member).file_size
+
+class SourceStream:
+    """
+    A readable, seekable binary stream over a file or a zip member reference.
+    Members (of nested zips too) are decompressed on the fly and never
+    extracted; seeking backwards inside a compressed member re-reads it from
+    its start, which costs CPU but no disk.
+    """
+
+    def __init__(self, path):
+        archive, *members = path.split(MEMBER_SEPARATOR)
+        self._open = [open(archive, 'rb')]
+        try:
+            for member in members:
+                zf = zipfile.ZipFile(self._open[-1])
+                self._open.append(zf)
+                self._open.append(zf.open(member))
+        except Exception:
+            self.close()
+            raise
+        self.file = self._open[-1]
+
+    def close(self):
+        for obj in reversed(self._open):
+            obj.close()
+        self._open = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def zip_members(path):
+    """
+    Yields a member reference for every .xlsx/.csv inside the zip at `path`
+    (itself possibly a member reference), descending into nested zips.
+    """
+    with SourceStream(path) as stream, zipfile.ZipFile(stream.file) as zf:
+        names = [info.filename for info in zf.infolist() if not info.is_dir()]
+    for name in names:
+        base = posixpath.basename(name)
+        if name.startswith("__MACOSX/") or base.startswith(("~$", "._")):
+            continue
+        if name.lower().endswith('.zip'):
+            yield from zip_members(member_path(path, name))
+        elif name.lower().endswith(SOURCE_EXTENSIONS):
+            yield member_path(path, name)
+
+def select_columns(rows, usecols):
+    """Keeps the `usecols` positions of each row, padding short rows with None."""
+    if usecols is None:
+        yield from rows
+        return
+    width = usecols[-1] + 1
+    pick = operator.itemgetter(*usecols)
+    single = len(usecols) == 1
+    for row in rows:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        yield (pick(row),) if single else pick(row)
+
+class SheetReader:
+    """
+    Reads the active sheet of an .xlsx file as tuples of cell values.
+    Subclasses set `name`, `max_row` (0 when unknown) and implement
+    iter_rows(start, usecols), which skips the first `start` rows (used to
+    resume a file). `usecols`, a sorted list of column indices, prunes each
+    row to those columns; readers skip decoding the others where they can.
+    `file_path` may be a zip member reference; `source` is then an open stream.
+    """
+    name = None
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.max_row = 0
+        self.stream = SourceStream(file_path) if is_member(file_path) else None
+        self.source = self.stream.file if self.stream else file_path
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def iter_rows(self, start=0, usecols=None):
+        raise NotImplementedError
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class OpenpyxlReader(SheetReader):
+    name = 'openpyxl'
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.wb = load_workbook(self.source, read_only=True)
+        self.ws = self.wb.active
+        self.max_row = self.ws.max_row or 0
+
+    def iter_rows(self, start=0, usecols=None):
+        return select_columns(self.ws.iter_rows(min_row=start + 1, values_only=True), usecols)
+
+    def close(self):
+        self.wb.close()
+        super().close()
+
+def active_sheet(zf):
+    """Returns (sheet name, member path) of the workbook's active sheet."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    view = workbook.find(f"{MAIN_NS_TAG}bookViews/{MAIN_NS_TAG}workbookView")
+    active_tab = int(view.get("activeTab", 0)) if view is not None else 0
+    sheets = workbook.findall(f"{MAIN_NS_TAG}sheets/{MAIN_NS_TAG}sheet")
+    sheet = sheets[active_tab] if active_tab < len(sheets) else sheets[0]
+    rel_id = sheet.get(f"{REL_NS}id")
+
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{PKG_REL_NS}Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return sheet.get("name"), target.lstrip("/")
+            return sheet.get("name"), posixpath.normpath(posixpath.join("xl", target))
+    raise KeyError(f"Sheet relationship {rel_id} not found")
+
+class XmlReader(SheetReader):
+    """
+    SAX-parses the sheet XML and sharedStrings.xml straight out of the zip with
+    expat, skipping openpyxl's per-cell object model. Cell values are cast the
+    same way openpyxl's read-only mode casts them, except that formula cells
+    yield their cached result rather than the formula text.
+    """
+    name = 'xml'
+    read_size = 1 << 16
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.zf = zipfile.ZipFile(self.source)
+        names = set(self.zf.namelist())
+        _, self.sheet_path = active_sheet(self.zf)
+        self.shared_strings = self._read_shared_strings() if "xl/sharedStrings.xml" in names else []
+        self.date_styles, self.epoch = self._read_date_styles(names)
+        self.max_col = 0
+        self._read_dimension()
+
+    def _read_shared_strings(self):
+        strings = []
+        text = []
+        state = {"skip": 0, "collect": False}
+        si_tag, t_tag, rph_tag = f"{MAIN_NS} si", f"{MAIN_NS} t", f"{MAIN_NS} rPh"
+
+        def start(tag, attrs):
+            if tag == rph_tag:
+                # Phonetic runs are not part of the string value.
+                state["skip"] += 1
+            elif tag == t_tag and not state["skip"]:
+                state["collect"] = True
+            elif tag == si_tag:
+                text.clear()
+
+        def end(tag):
+            if tag == t_tag:
+                state["collect"] = False
+            elif tag == rph_tag:
+                state["skip"] -= 1
+            elif tag == si_tag:
+                strings.append("".join(text))
+
+        def data(chunk):
+            if state["collect"]:
+                text.append(chunk)
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = data
+        with self.zf.open("xl/sharedStrings.xml") as f:
+            parser.ParseFile(f)
+        return strings
+
+    def _read_date_styles(self, names):
+        workbook = ET.fromstring(self.zf.read("xl/workbook.xml"))
+        pr = workbook.find(f"{MAIN_NS_TAG}workbookPr")
+        date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+        epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+        if "xl/styles.xml" not in names:
+            return set(), epoch
+
+        styles = ET.fromstring(self.zf.read("xl/styles.xml"))
+        formats = dict(BUILTIN_FORMATS)
+        for fmt in styles.iter(f"{MAIN_NS_TAG}numFmt"):
+            formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode")
+        date_styles = set()
+        cell_xfs = styles.find(f"{MAIN_NS_TAG}cellXfs")
+        if cell_xfs is not None:
+            for i, xf in enumerate(cell_xfs.findall(f"{MAIN_NS_TAG}xf")):
+                code = formats.get(int(xf.get("numFmtId", 0)))
+                if code and is_date_format(code):
+                    date_styles.add(str(i))
+        return date_styles, epoch
+
+    def _read_dimension(self):
+        with self.zf.open(self.sheet_path) as f:
+            for _, elem in ET.iterparse(f, events=("start",)):
+                if elem.tag == f"{MAIN_NS_TAG}dimension":
+                    min_col, min_row, max_col, max_row = range_boundaries(elem.get("ref"))
+                    self.max_col = max_col or 0
+                    self.max_row = max_row or 0
+                    return
+                if elem.tag == f"{MAIN_NS_TAG}sheetData":
+                    return
+
+    def _cell_value(self, data_type, style, value):
+        if not value:
+            return "" if data_type == "inlineStr" and value is not None else None
+        if data_type == "s":
+            return self.shared_strings[int(value)]
+        if data_type in ("str", "inlineStr", "e"):
+            return value
+        if data_type == "b":
+            return value == "1"
+        if data_type == "d":
+            return datetime.fromisoformat(value)
+
+        if "." in value or "E" in value or "e" in value:
+            number = float(value)
+        else:
+            number = int(value)
+        if style in self.date_styles:
+            return from_excel(number, self.epoch)
+        return number
+
+    def iter_rows(self, start=0, usecols=None):
+        row_tag, cell_tag = f"{MAIN_NS} row", f"{MAIN_NS} c"
+        value_tags = {f"{MAIN_NS} v", f"{MAIN_NS} t"}
+        columns = {}
+        pending = []
+        text = []
+        state = {"row": None, "expected_row": 1, "next_col": 0, "col": 0, "slot": 0,
+                 "type": "n", "style": None, "value": None, "collect": False}
+        # slots maps a column to its position in the pruned row; cells of other
+        # columns are scanned but never decoded.
+        slots = None if usecols is None else {col: i for i, col in enumerate(usecols)}
+        max_col = self.max_col if usecols is None else len(usecols)
+        cell_value = self._cell_value
+        skip = start
+
+        # Rows before `start` are still scanned but their cells are not decoded.
+        def start(tag, attrs):
+            if state["row"] is None and tag != row_tag:
+                return
+            if tag == cell_tag:
+                ref = attrs.get("r")
+                if ref:
+                    letters = ref.rstrip("0123456789")
+                    col = columns.get(letters)
+                    if col is None:
+                        col = columns[letters] = column_index_from_string(letters) - 1
+                else:
+                    col = state["next_col"]
+                state["col"] = col
+                state["slot"] = col if slots is None else slots.get(col)
+                state["type"] = attrs.get("t", "n")
+                state["style"] = attrs.get("s")
+                state["value"] = None
+                text.clear()
+            elif tag in value_tags:
+                state["collect"] = state["slot"] is not None
+            elif tag == row_tag:
+                row_number = int(attrs.get("r", state["expected_row"]))
+                # Missing <row> elements are empty rows, as in openpyxl.
+                while state["expected_row"] < row_number:
+                    if state["expected_row"] > skip:
+                        pending.append((None,) * max_col)
+                    state["expected_row"] += 1
+                state["expected_row"] = row_number + 1
+                state["row"] = [None] * max_col if row_number > skip else None
+                state["next_col"] = 0
+
+        def end(tag):
+            if state["row"] is None:
+                return
+            if tag in value_tags:
+                state["value"] = "".join(text)
+                state["collect"] = False
+            elif tag == cell_tag:
+                row, slot = state["row"], state["slot"]
+                state["next_col"] = state["col"] + 1
+                if slot is None:
+                    return
+                if slot >= len(row):
+                    row.extend([None] * (slot + 1 - len(row)))
+                row[slot] = cell_value(state["type"], state["style"], state["value"])
+            elif tag == row_tag:
+                pending.append(tuple(state["row"]))
+                state["row"] = None
+
+        def data(chunk):
+            if state["collect"]:
+                text.append(chunk)
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = data
+        with self.zf.open(self.sheet_path) as f:
+            while True:
+                block = f.read(self.read_size)
+                parser.Parse(block, not block)
+                yield from pending
+                pending.clear()
+                if not block:
+                    break
+
+    def close(self):
+        self.zf.close()
+        super().close()
+
+class CalamineReader(SheetReader):
+    """
+    Optional Rust-backed reader (python-calamine). The fastest backend, but it
+    loads the whole sheet into memory however it is opened, so its RSS grows
+    with the row count (see `benchmark.py readers`).
+    """
+    name = 'calamine'
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        with zipfile.ZipFile(self.source) as zf:
+            sheet_name, _ = active_sheet(zf)
+        if self.stream:
+            self.stream.file.seek(0)
+            self.wb = CalamineWorkbook.from_filelike(self.stream.file)
+        else:
+            self.wb = CalamineWorkbook.from_path(file_path)
+        self.sheet = self.wb.get_sheet_by_name(sheet_name)
+        self.max_row = self.sheet.height
+
+    @classmethod
+    def available(cls):
+        return CalamineWorkbook is not None
+
+    def iter_rows(self, start=0, usecols=None):
+        # Pruned before casting, so skipped cells cost nothing.
+        for row in select_columns(itertools.islice(self.sheet.iter_rows(), start, None), usecols):
+            yield tuple(self._cast(value) for value in row)
+
+    @staticmethod
+    def _cast(value):
+        # calamine reports empty cells as "" and every number as float, and
+        # date-only cells as date where openpyxl gives a datetime. Floats past
+        # 2**53 are not exact integers, so they are left as they are.
+        if value == "":
+            return None
+        if type(value) is float and value.is_integer() and abs(value) < 2**53:
+            return int(value)
+        if type(value) is date:
+            return datetime(value.year, value.month, value.day)
+        return value
+
+    def close(self):
+        close = getattr(self.wb, "close", None)
+        if close:
+            close()
+        super().close()
+
+class CsvReader(SheetReader):
+    """Reads a CSV file or member as rows of strings, with empty cells as None."""
+    name = 'csv'
+
+    def __init__(self, file_path, encoding='utf-8-sig'):
+        super().__init__(file_path)
+        binary = self.stream.file if self.stream else open(file_path, 'rb')
+        self.text = io.TextIOWrapper(binary, encoding=encoding, errors='replace', newline='')
+
+    def iter_rows(self, start=0, usecols=None):
+        self.text.seek(0)
+        for row in select_columns(itertools.islice(csv.reader(self.text), start, None), usecols):
+            yield tuple(value if value != "" else None for value in row)
+
+    def close(self):
+        self.text.close()
+        super().close()
+
+# Fastest first. 'auto' picks the streaming xml reader, or calamine for small
+# workbooks on disk, where loading the whole sheet costs little memory.
+CALAMINE_AUTO_MAX_BYTES = 8 * 1024 * 1024
+
+READERS = {
+    'calamine': CalamineReader,
+    'xml': XmlReader,
+    'openpyxl': OpenpyxlReader
+}
+
+def available_readers():
+    return [name for name, cls in READERS.items() if cls.available()]
+
+def open_reader(file_path, backend='auto'):
+    """Opens an .xlsx or .csv file, or a zip member reference to one."""
+    if file_path.lower().endswith('.csv'):
+        return CsvReader(file_path)
+    if backend == 'auto':
+        backends = available_readers()
+        # calamine holds the whole sheet in memory (roughly 13x the .xlsx size),
+        # so it is only picked for small files; everything else is streamed.
+        if len(backends) > 1 and (is_member(file_path) or os.path.getsize(file_path) > CALAMINE_AUTO_MAX_BYTES):
+            backends = [name for name in backends if name != 'calamine']
+        backend = backends[0]
+    cls = READERS[backend]
+    if not cls.available():
+        raise ValueError(f"Reader backend '{backend}' is not installed")
+    return cls(file_path)
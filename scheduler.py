@@ -0,0 +1,98 @@
+"""
+Pipelined stage scheduler: lets several queued files be in different stages
+at once (one being parsed while another is sorted and a third is zipped).
+"""
+import queue
+import threading
+
+_DONE = object()
+
+class Stage:
+    """
+    `workers` threads run `fn(job)` for this stage. At most `capacity` jobs wait
+    in front of it; a full inbox blocks the previous stage (backpressure), which
+    bounds how many files are in flight and how much spill data is on disk.
+    """
+
+    def __init__(self, name, fn, workers=1, capacity=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = queue.Queue(maxsize=capacity)
+
+class StagePipeline:
+    """
+    A job whose stage raises is handed to `on_error` and dropped; the other
+    jobs carry on. Only `should_stop` (polled) ends the whole run early: jobs
+    not yet started are then left alone and waiting ones are not run.
+    """
+
+    def __init__(self, stages, on_error=None, should_stop=None):
+        self.stages = stages
+        self.on_error = on_error
+        self.should_stop = should_stop or (lambda: False)
+        self.failed = threading.Event()
+
+    def _put(self, stage, item):
+        # Poll so a stop cannot leave this thread blocked on a full inbox.
+        while True:
+            if self.should_stop() and item is not _DONE:
+                return False
+            try:
+                stage.inbox.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+
+    def _run_stage(self, index, finished):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            job = stage.inbox.get()
+            if job is _DONE:
+                break
+            if self.should_stop():
+                continue
+            try:
+                stage.fn(job)
+            except Exception as e:
+                self.failed.set()
+                if self.on_error:
+                    self.on_error(job, stage, e)
+                continue
+            if next_stage is not None:
+                self._put(next_stage, job)
+
+        # The last worker of a stage to finish passes the end marker downstream.
+        with finished[index]["lock"]:
+            finished[index]["count"] += 1
+            last = finished[index]["count"] == stage.workers
+        if last and next_stage is not None:
+            for _ in range(next_stage.workers):
+                self._put(next_stage, _DONE)
+
+    def run(self, jobs):
+        """
+        Feeds jobs from the `jobs` iterable and blocks until every stage has
+        drained. Returns False if any job failed or the run was stopped.
+        """
+        finished = [{"lock": threading.Lock(), "count": 0} for _ in self.stages]
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._run_stage, args=(index, finished), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        try:
+            for job in jobs:
+                if not self._put(first, job):
+                    break
+        finally:
+            # Always release the stage threads, even if the job source raised.
+            for _ in range(first.workers):
+                self._put(first, _DONE)
+            for thread in threads:
+                thread.join()
+        return not self.failed.is_set() and not self.should_stop()
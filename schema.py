@@ -0,0 +1,224 @@
+"""
+Header-driven column mapping.
+
+Every field an output uses has a default sheet column (the layout the
+exports have always had) and a list of header aliases. A file's first row is
+matched against the aliases once. If it looks like a header (at least
+MIN_HEADER_MATCHES fields recognised), fields are located by name and the row
+is not treated as data; otherwise the default positions are used. Either way
+the result is compiled into one ProjectionPlan per file, which names the
+spilled columns, builds every output's projection and tells the reader
+which columns it may skip.
+"""
+import re
+
+def column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def excel_col_to_index(col):
+    index = 0
+    for i, char in enumerate(reversed(col)):
+        index += (ord(char.upper()) - 64) * (26 ** i)
+    return index - 1
+
+# field -> (default column letter, header aliases). Aliases are compared
+# after normalize_header, so case, spacing and punctuation do not matter.
+FIELDS = {
+    'email': ('A', ["email", "email address", "e mail", "work email", "contact email"]),
+    'first_name': ('E', ["first name", "firstname", "given name"]),
+    'last_name': ('G', ["last name", "lastname", "surname", "family name"]),
+    'occupation': ('K', ["occupation", "profession"]),
+    'department': ('M', ["department", "dept"]),
+    'job_title': ('O', ["job title", "title", "position"]),
+    'job_level': ('Q', ["job level", "seniority", "level"]),
+    'city': ('S', ["city", "town"]),
+    'state': ('U', ["state", "province", "region", "state province"]),
+    'country': ('W', ["country", "country name", "nation"]),
+    'linkedin': ('AA', ["linkedin", "linkedin profile", "linkedin url", "person linkedin url", "linkdin"]),
+    'employer': ('AC', ["employer", "company", "company name", "employer name", "organization"]),
+    'employer_website': ('AE', ["employer website", "company website", "website", "domain"]),
+    'phone': ('AG', ["phone", "phone number", "mobile", "telephone"]),
+    'employer_facebook': ('AI', ["employer facebook", "employer facebook page", "company facebook"]),
+    'employer_linkedin': ('AK', ["employer linkedin", "company linkedin", "company linkedin url"]),
+    'employer_founded': ('AS', ["employer founded date", "employer founded", "founded", "year founded"]),
+    'employer_zip': ('AY', ["employer zip", "zip", "zip code", "postal code"]),
+    'language': ('BE', ["languages spoken", "language", "languages"]),
+    'industry': ('BG', ["industry", "employer industry"]),
+    'focus': ('BI', ["focus"]),
+    'skills': ('BK', ["skills"]),
+    'personalised_lines': ('BM', ["personalised lines", "personalized lines", "icebreaker"])
+}
+
+# Fields every file needs: the country groups the rows, the rest sort them.
+# They are spilled under these names; every other column as Column<n>.
+KEY_FIELDS = {
+    'country': 'Country',
+    'language': 'Language',
+    'occupation': 'Occupation',
+    'industry': 'Industry'
+}
+
+# Location fields repaired by the normalization step, with their review label.
+LOCATION_FIELDS = {'city': "City", 'state': "State", 'country': "Country"}
+
+# Upload formats, as (header, field).
+RACHINBOX_COLUMNS = [
+    ("Email", 'email'),
+    ("First_Name", 'first_name'),
+    ("Last_Name", 'last_name'),
+    ("Company_Name", 'employer'),
+    ("Linkdin", 'linkedin'),
+    ("Personalised_Lines", 'personalised_lines')
+]
+
+GHL_COLUMNS = [
+    ("Email", 'email'),
+    ("First_Name", 'first_name'),
+    ("Last_Name", 'last_name'),
+    ("Department", 'department'),
+    ("Job_Title", 'job_title'),
+    ("Job_Level", 'job_level'),
+    ("City", 'city'),
+    ("State", 'state'),
+    ("Country", 'country'),
+    ("LinkedIn_Profile", 'linkedin'),
+    ("Employer", 'employer'),
+    ("Employer_Website", 'employer_website'),
+    ("Phone", 'phone'),
+    ("Employer_Facebook", 'employer_facebook'),
+    ("Employer_LinkedIn", 'employer_linkedin'),
+    ("Employer_Founded_Date", 'employer_founded'),
+    ("Employer_Zip", 'employer_zip'),
+    ("Languages_Spoken", 'language'),
+    ("Industry", 'industry'),
+    ("Focus", 'focus'),
+    ("Skills", 'skills')
+]
+
+# The outputs built from a fixed field list; 'processed' keeps every column.
+UPLOAD_FORMATS = {
+    'rachInbox': RACHINBOX_COLUMNS,
+    'ghl': GHL_COLUMNS
+}
+
+MIN_HEADER_MATCHES = 3
+
+def normalize_header(text):
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(text).lower()).split())
+
+ALIASES = {normalize_header(alias): field for field, (_, aliases) in FIELDS.items()
+           for alias in aliases + [field]}
+ALIASES.update({normalize_header(header): field
+                for columns in UPLOAD_FORMATS.values() for header, field in columns})
+
+DEFAULT_POSITIONS = {field: excel_col_to_index(letter) for field, (letter, _) in FIELDS.items()}
+
+def is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def match_header(row):
+    """Maps fields to positions by header name; the first column matching a field wins."""
+    positions = {}
+    for index, value in enumerate(row):
+        if value is None:
+            continue
+        field = ALIASES.get(normalize_header(value))
+        if field is not None and field not in positions:
+            positions[field] = index
+    return positions
+
+class ProjectionPlan:
+    """
+    Where each field is in one file and how every output is built from it.
+    `header` says whether the first row is a header (and so not data).
+    `usecols` lists the source columns the outputs need, or is None when
+    every column must be read (the processed output keeps them all).
+    """
+
+    def __init__(self, positions, header, outputs, assumed=()):
+        self.positions = positions
+        self.header = header
+        self.assumed = list(assumed)
+        self.outputs = list(outputs)
+        self.key_columns = {positions[field]: name for field, name in KEY_FIELDS.items()}
+        if 'processed' in self.outputs:
+            self.usecols = None
+        else:
+            fields = set(KEY_FIELDS) | set(LOCATION_FIELDS)
+            for output in self.outputs:
+                fields.update(field for _, field in UPLOAD_FORMATS[output])
+            self.usecols = sorted({positions[field] for field in fields if field in positions})
+
+    def describe(self):
+        """What the plan resolved, for the run report. `moved` lists fields found away from their default column."""
+        return {
+            "header": self.header,
+            "fields": {field: column_letter(index) for field, index in self.positions.items()},
+            "missing": [field for field in FIELDS if field not in self.positions],
+            "moved": [field for field, index in self.positions.items() if index != DEFAULT_POSITIONS.get(field)],
+            "assumed": self.assumed,
+            "columns_read": "all" if self.usecols is None else len(self.usecols)
+        }
+
+    def column_name(self, index):
+        """Name of source column `index` in the spilled chunks."""
+        return self.key_columns.get(index, f"Column{index+1}")
+
+    def field_column(self, field):
+        """Spilled column holding `field`, or None if the file does not have it."""
+        index = self.positions.get(field)
+        return None if index is None else self.column_name(index)
+
+    @property
+    def location_columns(self):
+        """{spilled column: review label} of the location fields present."""
+        return {self.field_column(field): label for field, label in LOCATION_FIELDS.items()
+                if field in self.positions}
+
+    def projections(self, columns, has_content):
+        """
+        Builds each output's projection as (header, spilled column) pairs; the
+        column is None for a field the file lacks. The processed output keeps
+        every column with content anywhere in the file (plus the sort keys) and
+        numbers the rest by their new position.
+        """
+        keys = set(self.key_columns.values())
+        projections = {}
+        for output in self.outputs:
+            if output == 'processed':
+                kept = [col for col, keep in zip(columns, has_content) if keep or col in keys]
+                projections[output] = [(col if col in keys else f"Column{i+1}", col)
+                                       for i, col in enumerate(kept)]
+            else:
+                projections[output] = [(header, self.field_column(field))
+                                       for header, field in UPLOAD_FORMATS[output]]
+        return projections
+
+def compile_plan(first_row, outputs):
+    """
+    Compiles the plan for a file from its first row. A non-key field whose
+    header is not recognised is assumed to be in its default column, as long
+    as that column's header cell is blank. Raises IndexError if the file
+    lacks one of the KEY_FIELDS (by header, or by width when it has none).
+    """
+    if first_row is None:
+        # An empty sheet: nothing will be read, so any plan will do.
+        return ProjectionPlan(dict(DEFAULT_POSITIONS), False, outputs)
+    positions = match_header(first_row)
+    if len(positions) >= MIN_HEADER_MATCHES:
+        # The key fields group and sort every row, so they must be named in the header.
+        missing = [name for field, name in KEY_FIELDS.items() if field not in positions]
+        if missing:
+            raise IndexError(f"Sheet has no {'/'.join(missing)} column")
+        assumed = [field for field, index in DEFAULT_POSITIONS.items()
+                   if field not in positions and index < len(first_row) and is_blank(first_row[index])]
+        positions.update((field, DEFAULT_POSITIONS[field]) for field in assumed)
+        return ProjectionPlan(positions, True, outputs, assumed)
+    if len(first_row) <= max(DEFAULT_POSITIONS[field] for field in KEY_FIELDS):
+        raise IndexError("Sheet is missing one of the Country/Language/Occupation/Industry columns")
+    return ProjectionPlan(dict(DEFAULT_POSITIONS), False, outputs)
@@ -2,6 +2,7 @@ import os
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import csv
+from csv_sink import RollingCsvWriter
 
 def split_large_csv_files(src_folder, size_limit=48):
     """
@@ -21,46 +22,19 @@ def split_large_csv_files(src_folder, size_limit=48):
                 if file_size >= size_limit:
                     print(f"Processing file {file} of size {file_size:.2f} MB")
 
+                    # Stream the rows straight into size-bounded parts; the writer
+                    # counts exact encoded bytes, so no part goes over the limit.
                     with open(file_path, mode='r', newline='', encoding='utf-8') as f:
                         reader = csv.reader(f)
                         header = next(reader)  # Read the header row
-                        rows = list(reader)  # Read all the data rows
+                        writer = RollingCsvWriter(root, file, header, size_limit=size_limit * 1024 * 1024,
+                                                  lineterminator='\r\n', single_name=False)
+                        for row in reader:
+                            writer.write_row(row)
 
-                    # Start splitting the file into smaller files
-                    data_chunk = []
-                    current_size = 0
-                    part_number = 1
+                    for new_file in writer.close():
+                        print(f"Created: {os.path.join(root, new_file)}")
 
-                    for row in rows:
-                        # Add row to current chunk
-                        data_chunk.append(row)
-                        current_size += len(','.join(row))  # Approximate size by row length
-
-                        # If current size exceeds the size limit, write to a new file
-                        if current_size >= size_limit * 1024 * 1024:
-                            # Define the new split file path
-                            new_file_path = os.path.join(root, f"{file}_part_{part_number}.csv")
-                            with open(new_file_path, mode='w', newline='', encoding='utf-8') as new_file:
-                                writer = csv.writer(new_file)
-                                writer.writerow(header)  # Write header to the new file
-                                writer.writerows(data_chunk)  # Write the data chunk to the new file
-
-                            print(f"Created: {new_file_path}")
-
-                            # Reset for the next chunk
-                            part_number += 1
-                            data_chunk = []
-                            current_size = 0
-
-                    # If there are any remaining rows, write them to a final file
-                    if data_chunk:
-                        new_file_path = os.path.join(root, f"{file}_part_{part_number}.csv")
-                        with open(new_file_path, mode='w', newline='', encoding='utf-8') as new_file:
-                            writer = csv.writer(new_file)
-                            writer.writerow(header)  # Write header to the new file
-                            writer.writerows(data_chunk)  # Write the remaining data
-                        print(f"Created: {new_file_path}")
-                    
                     # Delete the large file
                     # os.remove(file_path)
                     # print(f"Deleted: {file} ({file_size:.2f} MB)")
@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+
+from csv_sink import RollingCsvWriter
+
+HEADER = ["Email", "Name", "Note"]
+
+def frame(start, count):
+    return pd.DataFrame({"Email": [f"user{i}@example.com" for i in range(start, start + count)],
+                         "Name": [f"Name {i}" for i in range(start, start + count)],
+                         "Note": ["has, a comma" if i % 3 == 0 else None for i in range(start, start + count)]},
+                        dtype=object)
+
+def test_parts_stay_under_the_size_limit(tmp_path):
+    writer = RollingCsvWriter(str(tmp_path), "US", HEADER, size_limit=300, lineterminator="\n")
+    for start in range(0, 60, 20):
+        writer.write_frame(frame(start, 20))
+    files = writer.close()
+
+    assert len(files) > 1
+    assert files == [f"US_part_{n}.csv" for n in range(1, len(files) + 1)]
+    rows = []
+    for name in files:
+        path = tmp_path / name
+        assert os.path.getsize(path) <= 300
+        lines = path.read_text().splitlines()
+        assert lines[0] == "Email,Name,Note"
+        rows += lines[1:]
+    # Every record is written once, in order, and none is cut across parts.
+    expected = frame(0, 60).to_csv(header=False, index=False, lineterminator="\n").splitlines()
+    assert rows == expected
+
+def test_small_output_keeps_its_name(tmp_path):
+    writer = RollingCsvWriter(str(tmp_path), "US.csv", HEADER, size_limit=10000, lineterminator="\n")
+    writer.write_frame(frame(0, 5))
+    assert writer.close() == ["US.csv"]
+
+def test_oversized_record_gets_a_part_of_its_own(tmp_path):
+    writer = RollingCsvWriter(str(tmp_path), "US", HEADER, size_limit=40, lineterminator="\n")
+    writer.write_row(["a@example.com", "A", "x" * 100])
+    writer.write_row(["b@example.com", "B", None])
+    files = writer.close()
+    assert len(files) == 2
+    assert (tmp_path / files[0]).read_text().count("\n") == 2
@@ -0,0 +1,81 @@
+import pytest
+
+from ghl_mock import MockGhlServer
+from ghl_upload import GhlUploader, UploadError, UploadSettings
+from job_store import JobStore
+
+TOKEN = "test-token"
+LOCATION = "loc-1"
+
+def contacts(count):
+    return [("US.csv", {"Email": f"user{i}@example.com", "First_Name": f"First{i}", "Country": "United States",
+                        "Skills": "Python"}) for i in range(count)]
+
+@pytest.fixture
+def server():
+    mock = MockGhlServer(token=TOKEN, rate=1000, interval=1.0)
+    mock.url = mock.start()
+    yield mock
+    mock.stop()
+
+def uploader(server, tmp_path, max_retries=3):
+    settings = UploadSettings(TOKEN, LOCATION, server.url, batch_size=20, max_retries=max_retries)
+    return GhlUploader(settings, JobStore(str(tmp_path / "state")))
+
+def test_upload_then_rerun_sends_nothing_twice(server, tmp_path):
+    rows = contacts(50)
+    result = uploader(server, tmp_path).upload(iter(rows))
+    assert (result.sent, result.skipped) == (50, 0)
+    assert server.stats["created"] == 50
+
+    again = uploader(server, tmp_path).upload(iter(rows))
+    assert (again.sent, again.skipped) == (0, 50)
+    assert server.stats["duplicates"] == 0
+
+def test_stopped_upload_resumes_where_it_stopped(server, tmp_path):
+    rows = contacts(100)
+
+    def stop_after_two(result):
+        if result.rows >= 40:
+            raise RuntimeError("stopped")
+
+    with pytest.raises(RuntimeError):
+        uploader(server, tmp_path).upload(iter(rows), on_batch=stop_after_two)
+    assert server.stats["created"] == 40
+
+    result = uploader(server, tmp_path).upload(iter(rows))
+    assert (result.sent, result.skipped) == (60, 40)
+    assert server.stats["created"] == 100
+    assert server.stats["duplicates"] == 0
+
+def test_retries_server_errors(tmp_path):
+    mock = MockGhlServer(token=TOKEN, rate=1000, interval=1.0, fail_rate=0.3, seed=3)
+    mock.url = mock.start()
+    try:
+        result = uploader(mock, tmp_path, max_retries=10).upload(iter(contacts(40)))
+    finally:
+        mock.stop()
+    assert mock.stats["failed"] > 0
+    assert (result.sent, result.failed) == (40, 0)
+
+class RefusingServer(MockGhlServer):
+    """Answers one contact with a 403, which fails the whole upload."""
+
+    async def _handle(self, method, path, headers, body):
+        if b"user7@" in body:
+            return 403, {}, {"message": "Forbidden"}
+        return await super()._handle(method, path, headers, body)
+
+def test_refused_upload_records_the_contacts_already_sent(tmp_path):
+    mock = RefusingServer(token=TOKEN, rate=1000, interval=1.0)
+    mock.url = mock.start()
+    try:
+        with pytest.raises(UploadError):
+            uploader(mock, tmp_path).upload(iter(contacts(20)))
+        created = mock.stats["created"]
+        result = uploader(mock, tmp_path).upload(iter(c for c in contacts(20) if c[1]["Email"] != "user7@example.com"))
+    finally:
+        mock.stop()
+    assert created == 19
+    assert (result.sent, result.skipped) == (0, 19)
+    assert mock.stats["duplicates"] == 0
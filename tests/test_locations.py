@@ -0,0 +1,35 @@
+import numpy as np
+
+from job_store import JobStore
+from locations import NOT_UNDERSTOOD, REPAIRED, UNDERSTOOD, LocationNormalizer, normalize_location
+
+def test_normalize_location():
+    assert normalize_location("São Paulo") == ("Sao Paulo", REPAIRED)
+    assert normalize_location("SÃ£o Paulo") == ("Sao Paulo", REPAIRED)  # mojibake
+    assert normalize_location("Z?rich") == ("Z?rich", NOT_UNDERSTOOD)
+    assert normalize_location("Boston") == ("Boston", UNDERSTOOD)
+    # Only Latin letters are folded.
+    assert normalize_location("서울") == ("서울", UNDERSTOOD)
+    assert normalize_location("Київ") == ("Київ", UNDERSTOOD)
+
+def test_only_changed_or_flagged_values_are_stored(tmp_path):
+    store = JobStore(str(tmp_path))
+    normalizer = LocationNormalizer(store.locations)
+    values = np.array(["Boston", "São Paulo", "Z?rich", "서울", None, "Boston"], dtype=object)
+    review = {}
+    out = normalizer.normalize_column(values, review, "City")
+    assert list(out) == ["Boston", "Sao Paulo", "Z?rich", "서울", None, "Boston"]
+    assert review == {("City", "São Paulo"): 1, ("City", "Z?rich"): 1}
+    store.save_locations(normalizer.take_new())
+    assert set(store.locations(["Boston", "São Paulo", "Z?rich", "서울"])) == {"São Paulo", "Z?rich", "서울"}
+
+def test_stored_edits_override_and_cache_is_bounded(tmp_path):
+    store = JobStore(str(tmp_path))
+    store.save_locations({"Bostn": ("Boston", REPAIRED)})
+    normalizer = LocationNormalizer(store.locations, size=3)
+    assert normalizer.lookup("Bostn") == ("Boston", REPAIRED)
+    for value in ["a", "b", "c", "d"]:
+        normalizer.lookup(value)
+    assert list(normalizer.cache) == ["b", "c", "d"]
+    # Evicted, then fetched from the store again.
+    assert normalizer.lookup("Bostn") == ("Boston", REPAIRED)
@@ -0,0 +1,47 @@
+import io
+import zipfile
+
+import openpyxl
+
+from readers import SourceStream, member_path, open_reader, source_size, zip_members
+
+ROWS = [["Email", "Name"], ["a@example.com", "Ann"], ["b@example.com", "Bob"]]
+
+def xlsx_bytes():
+    wb = openpyxl.Workbook()
+    for row in ROWS:
+        wb.active.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def write_drop(path):
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("contacts.xlsx", xlsx_bytes())
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("list.csv", "\n".join(",".join(row) for row in ROWS) + "\n")
+        zf.writestr("__MACOSX/._list.csv", "junk")
+        zf.writestr("notes.txt", "skip me")
+        zf.writestr("2024/batch.zip", inner.getvalue())
+
+def test_zip_members_are_found_and_streamed(tmp_path):
+    drop = str(tmp_path / "drop.zip")
+    write_drop(drop)
+    members = list(zip_members(drop))
+    assert members == [member_path(drop, "list.csv"),
+                       member_path(member_path(drop, "2024/batch.zip"), "contacts.xlsx")]
+    for member in members:
+        with open_reader(member) as reader:
+            assert [list(row) for row in reader.iter_rows()] == ROWS
+        with SourceStream(member) as stream:
+            assert len(stream.file.read()) == source_size(member)
+    # Nothing is extracted next to the archive.
+    assert [p.name for p in tmp_path.iterdir()] == ["drop.zip"]
+
+def test_member_reader_skips_rows_and_selects_columns(tmp_path):
+    drop = str(tmp_path / "drop.zip")
+    write_drop(drop)
+    member = member_path(member_path(drop, "2024/batch.zip"), "contacts.xlsx")
+    with open_reader(member) as reader:
+        assert [list(row) for row in reader.iter_rows(start=1, usecols=[1])] == [["Ann"], ["Bob"]]
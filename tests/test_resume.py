@@ -0,0 +1,73 @@
+import os
+import zipfile
+
+import pytest
+
+from job_store import JobStore
+from pipeline import Processor
+from test_sort_modes import Reporter, write_contacts
+
+def archive_contents(folder):
+    contents = {}
+    for archive in sorted(os.listdir(folder)):
+        if archive.endswith(".zip"):
+            output = archive.rsplit("_", 2)[0]
+            with zipfile.ZipFile(os.path.join(folder, archive)) as zf:
+                assert zf.testzip() is None
+                for info in zf.infolist():
+                    contents[output, info.filename] = zf.read(info)
+    return contents
+
+def processor(state, output):
+    processor = Processor(Reporter(), JobStore(str(state)))
+    processor.save_dir = str(output)
+    processor.sort_mode = 'external'
+    processor.chunk_rows = 200
+    processor.write_reports = False
+    processor.pool.set_cpu_percent(100)
+    return processor
+
+def run_queue(processor):
+    try:
+        processor.process_queue()
+    finally:
+        processor.pool.shutdown()
+
+@pytest.mark.parametrize("stage", ["read", "sort"])
+def test_stopped_file_resumes_to_identical_archives(tmp_path, stage):
+    source = tmp_path / "contacts.csv"
+    write_contacts(source)
+
+    reference = processor(tmp_path / "state_ref", tmp_path / "ref")
+    reference.enqueue(str(source))
+    run_queue(reference)
+
+    first = processor(tmp_path / "state", tmp_path / "out")
+    first.enqueue(str(source))
+    save_checkpoint = first.save_checkpoint
+    stopped = []
+
+    def stop_midway(job):
+        save_checkpoint(job)
+        read = job.checkpoint.get("read", {})
+        sort = job.checkpoint.get("sort", {})
+        if not stopped and (read.get("rows", 0) >= 1000 if stage == "read" else len(sort.get("done", ())) >= 1):
+            stopped.append(job)
+            first.control.stop()
+
+    first.save_checkpoint = stop_midway
+    run_queue(first)
+    assert stopped
+    record = first.store.unfinished()[0]
+    assert record.stage != "done"
+    # Leave torn writes past the checkpoint, like a crash would; resuming truncates them.
+    for spill in stopped[0].spills.values():
+        if os.path.exists(spill.path):
+            with open(spill.path, 'ab') as f:
+                f.write(b"torn block")
+
+    resumed = processor(tmp_path / "state", tmp_path / "out")
+    assert resumed.queue == [record.id]
+    run_queue(resumed)
+    assert resumed.store.get(record.id).status == "done"
+    assert archive_contents(tmp_path / "out") == archive_contents(tmp_path / "ref")
@@ -0,0 +1,31 @@
+import threading
+
+from scheduler import Stage, StagePipeline
+
+def test_failing_job_does_not_stop_the_others():
+    done = []
+    errors = []
+
+    def read(job):
+        if job == "bad":
+            raise ValueError("corrupt")
+
+    pipeline = StagePipeline([Stage("read", read), Stage("sort", done.append, workers=2)],
+                             on_error=lambda job, stage, e: errors.append((job, stage.name)))
+    ok = pipeline.run(["a", "bad", "b", "c"])
+    assert not ok
+    assert errors == [("bad", "read")]
+    assert sorted(done) == ["a", "b", "c"]
+
+def test_stop_ends_the_run():
+    stop = threading.Event()
+    done = []
+
+    def read(job):
+        if job == 2:
+            stop.set()
+        done.append(job)
+
+    pipeline = StagePipeline([Stage("read", read)], should_stop=stop.is_set)
+    assert not pipeline.run(range(100))
+    assert len(done) < 100
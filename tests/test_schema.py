@@ -0,0 +1,23 @@
+import pytest
+
+from schema import DEFAULT_POSITIONS, compile_plan
+
+OUTPUTS = ['processed', 'rachInbox', 'ghl']
+
+def test_header_without_key_columns_is_rejected():
+    # Wide enough for every default position, but no header names the key fields.
+    header = ["Email", "First Name", "Last Name"] + [f"Custom {i}" for i in range(20)]
+    with pytest.raises(IndexError, match="Country/Language/Occupation/Industry"):
+        compile_plan(header, OUTPUTS)
+
+def test_only_blank_default_columns_are_assumed():
+    header = [None] * 70
+    for field, name in [('email', "Email"), ('country', "Country"), ('language', "Language"),
+                        ('occupation', "Occupation"), ('industry', "Industry")]:
+        header[DEFAULT_POSITIONS[field]] = name
+    header[DEFAULT_POSITIONS['city']] = "Notes"
+    plan = compile_plan(header, OUTPUTS)
+    assert plan.header
+    assert 'city' not in plan.positions
+    assert plan.positions['state'] == DEFAULT_POSITIONS['state']
+    assert 'state' in plan.assumed
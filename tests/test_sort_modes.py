@@ -0,0 +1,65 @@
+import os
+import random
+import zipfile
+
+import pytest
+
+from job_store import JobStore
+from pipeline import Processor
+
+class Reporter:
+    def set_status(self, text):
+        pass
+
+    def set_progress(self, value):
+        pass
+
+def write_contacts(path, rows=3000, seed=7):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Email,First Name,Last Name,City,State,Country,Language,Occupation,Industry,Phone\n")
+        for i in range(rows):
+            f.write(",".join([
+                f"user{i}@example.com", f"First{i}", f"Last{i}",
+                rng.choice(["Paris", "Lyon", "Berlin"]), rng.choice(["IDF", "BY", ""]),
+                rng.choice(["France", "Germany", "United States"]), rng.choice(["English", "French", ""]),
+                rng.choice(["Engineer", "Manager", "Analyst"]), rng.choice(["IT", "Finance", "Retail"]),
+                f"0{rng.randrange(10**8):08d}"
+            ]) + "\n")
+
+def run(tmp_path, source, name, sort_mode, chunk_rows, sort_memory_mb=None):
+    processor = Processor(Reporter(), JobStore(str(tmp_path / f"state_{name}")))
+    processor.save_dir = str(tmp_path / name)
+    processor.sort_mode = sort_mode
+    processor.chunk_rows = chunk_rows
+    if sort_memory_mb is not None:
+        processor.sort_memory_mb = sort_memory_mb
+    processor.write_reports = False
+    try:
+        processor.process_file(str(source))
+    finally:
+        processor.pool.shutdown()
+    contents = {}
+    for archive in sorted(os.listdir(processor.save_dir)):
+        output = archive.rsplit("_", 2)[0]
+        with zipfile.ZipFile(os.path.join(processor.save_dir, archive)) as zf:
+            for info in zf.infolist():
+                contents[output, info.filename] = zf.read(info)
+    return contents
+
+@pytest.mark.parametrize("chunk_rows", [7, 250])
+def test_external_sort_matches_memory_sort(tmp_path, chunk_rows):
+    source = tmp_path / "contacts.csv"
+    write_contacts(source)
+    memory = run(tmp_path, source, "memory", "memory", 50000)
+    external = run(tmp_path, source, f"external_{chunk_rows}", "external", chunk_rows)
+    assert memory
+    assert external == memory
+
+def test_capped_merge_matches_memory_sort(tmp_path):
+    # A 1 MB cap shrinks the spill blocks and the fan-in, so the merge runs in passes.
+    source = tmp_path / "contacts.csv"
+    write_contacts(source)
+    memory = run(tmp_path, source, "memory", "memory", 50000)
+    capped = run(tmp_path, source, "capped", "auto", 20, sort_memory_mb=1)
+    assert capped == memory
@@ -0,0 +1,25 @@
+import zipfile
+
+import zip_stream
+from zip_stream import ZipStreamWriter, compress_member
+
+def test_forced_zip64_archive_passes_testzip(tmp_path, monkeypatch):
+    # Lower the limits so every size, offset and the entry count take the ZIP64 records.
+    monkeypatch.setattr(zip_stream, "ZIP64_LIMIT", 1)
+    monkeypatch.setattr(zip_stream, "ZIP64_COUNT_LIMIT", 1)
+    expected = {}
+    archive = tmp_path / "out.zip"
+    writer = ZipStreamWriter(str(archive))
+    for i, method in enumerate(["stored", "deflate", "deflate"]):
+        source = tmp_path / f"part{i}.csv"
+        data = "".join(f"{i},{n},row {n}\n" for n in range(2000)).encode()
+        source.write_bytes(data)
+        expected[source.name] = data
+        writer.add(compress_member(str(source), source.name, method))
+    writer.close()
+    assert b"PK\x06\x06" in archive.read_bytes()  # ZIP64 end of central directory
+
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.testzip() is None
+        assert {info.filename: zf.read(info) for info in zf.infolist()} == expected
+        assert all(info.extra for info in zf.infolist())
@@ -0,0 +1,153 @@
+"""
+One long-lived process pool shared by every queued file and stage.
+"""
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_CPU_PERCENT = 50
+
+class RunControl:
+    """
+    Pause and stop flags shared by the GUI, the stage threads and the pool
+    workers. They are multiprocessing events, so a worker process blocks on
+    the same pause (without spinning) and sees the same stop as the threads.
+    """
+
+    def __init__(self):
+        self._running = multiprocessing.Event()
+        self._stop = multiprocessing.Event()
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        # Also wake anything waiting on a pause so it can see the stop.
+        self._stop.set()
+        self._running.set()
+
+    def reset(self):
+        self._stop.clear()
+        self._running.set()
+
+    def wait_if_paused_or_stopped(self):
+        """Blocks while paused; raises once processing has been stopped."""
+        self._running.wait()
+        if self._stop.is_set():
+            raise Exception("Processing stopped by user")
+
+# The RunControl of the pool this worker process belongs to.
+_control = None
+
+def wait_if_paused_or_stopped():
+    """For tasks running in a pool worker; a no-op outside one."""
+    if _control is not None:
+        _control.wait_if_paused_or_stopped()
+
+def warm_worker(control=None):
+    """Imports the heavy modules and probes the reader backends once per process."""
+    global _control
+    _control = control
+    # Ctrl+C is handled by the parent, which stops the run through `control`.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import pandas  # noqa: F401
+    import external_sort  # noqa: F401
+    import readers
+    readers.available_readers()
+
+def workers_for_percent(cpu_percent):
+    return max(1, round(multiprocessing.cpu_count() * cpu_percent / 100))
+
+class WorkerPool:
+    """
+    At most `max_workers` tasks are in flight at once, so the CPU share can be
+    changed while work is running. The executor is sized to the share: with
+    fork it starts all of its processes up front. Raising the share replaces
+    it with a bigger one (the old one finishes its tasks and exits); lowering
+    it leaves the extra workers idle.
+    """
+
+    def __init__(self, cpu_percent=DEFAULT_CPU_PERCENT, control=None):
+        self.cpu_percent = cpu_percent
+        self.control = control
+        self.executor = None
+        self.executor_size = 0
+        self._running = 0
+        self._cond = threading.Condition()
+
+    @property
+    def max_workers(self):
+        return workers_for_percent(self.cpu_percent)
+
+    def set_cpu_percent(self, cpu_percent):
+        with self._cond:
+            self.cpu_percent = cpu_percent
+            self._cond.notify_all()
+            # Lowering the share needs no new processes.
+            grow = self.executor is None or self.max_workers > self.executor_size
+        if grow:
+            self.warm_up()
+
+    def _ensure_executor(self):
+        if self.executor is not None and self.executor_size < self.max_workers:
+            # Tasks already submitted still run; new ones go to the bigger pool.
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        if self.executor is None:
+            self.executor_size = self.max_workers
+            self.executor = ProcessPoolExecutor(max_workers=self.executor_size,
+                                                initializer=warm_worker, initargs=(self.control,))
+
+    def warm_up(self):
+        """Starts up to max_workers processes ahead of the first real task."""
+        with self._cond:
+            self._ensure_executor()
+            for _ in range(self.max_workers):
+                self.executor.submit(int)
+
+    def submit(self, fn, *args, should_stop=None):
+        """
+        Blocks while max_workers tasks are already running. `should_stop` is
+        polled while waiting so a stop request is not stuck behind a full pool.
+        """
+        with self._cond:
+            while self._running >= self.max_workers:
+                if should_stop is not None and should_stop():
+                    raise Exception("Processing stopped by user")
+                self._cond.wait(timeout=0.2)
+            self._ensure_executor()
+            try:
+                future = self.executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died; start over with a fresh pool.
+                self.executor = None
+                self._ensure_executor()
+                future = self.executor.submit(fn, *args)
+            self._running += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def shutdown(self):
+        with self._cond:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None